@@ -0,0 +1,97 @@
+"""Pre-rendered tile sprites
+
+Every tile type gets one sprite per edge variant when the atlas is built.
+The variant is a 4-bit mask of which neighbours hold the same tile
+(UP, RIGHT, DOWN, LEFT); the outline is only drawn on the other sides, so a
+patch of stone reads as one shape instead of a grid. Shaded copies for each
+light level are made the first time they are needed.
+
+New tile types in tiles.json get sprites automatically: a flat fill with a
+speckle texture and outline, unless their "style" names a custom painter
+in DETAILS.
+"""
+import random
+import pygame
+from tiles import TILES
+
+UP, RIGHT, DOWN, LEFT = 1, 2, 4, 8
+# transparent parts of sprites; must match the chunk surfaces' colorkey
+COLORKEY = (255, 0, 255)
+# brightness multiplier for each light level; fully dark tiles stay faintly visible
+BRIGHTNESS = [0.12 + 0.88 * level / 15 for level in range(16)]
+
+
+def _paint_block(surface, tile, tw):
+    surface.fill(tile.color)
+    # a few darker and lighter specks, the same for every tile of a type
+    rng = random.Random(tile.name)
+    r, g, b = tile.color[:3]
+    for _ in range(max(2, tw * tw // 48)):
+        shade = rng.choice((0.82, 1.12))
+        color = (min(255, int(r * shade)), min(255, int(g * shade)), min(255, int(b * shade)))
+        size = max(1, tw // 12)
+        surface.fill(color, (rng.randrange(tw - size + 1), rng.randrange(tw - size + 1), size, size))
+
+
+def _paint_torch(surface, tile, tw):
+    surface.fill((0, 0, 0, 0))
+    stick = pygame.Rect(0, 0, max(2, tw // 6), tw // 2)
+    stick.midbottom = (tw // 2, tw)
+    surface.fill((110, 80, 50), stick)
+    flame = pygame.Rect(0, 0, max(3, tw // 3), max(3, tw // 3))
+    flame.midbottom = stick.midtop
+    pygame.draw.ellipse(surface, tile.color, flame)
+
+
+# custom painters by tile style; anything else is drawn as a textured block
+DETAILS = {'torch': _paint_torch}
+
+
+class TileAtlas:
+    """Sprites for every (tile id, edge mask), shaded on demand by light level."""
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        # base[tile_id][mask] -> SRCALPHA sprite at full brightness
+        self.base = [None] + [[self._make(tile, mask) for mask in range(16)] for tile in TILES[1:]]
+        self.shaded = {}  # (tile_id << 8) | (mask << 4) | level -> colorkeyed sprite
+
+    def _make(self, tile, mask):
+        tw = self.tile_size
+        surface = pygame.Surface((tw, tw), pygame.SRCALPHA)
+        paint = DETAILS.get(tile.style)
+        if paint is not None:
+            paint(surface, tile, tw)
+            return surface
+        _paint_block(surface, tile, tw)
+        edge = (0, 0, 0)
+        if not mask & UP:
+            surface.fill(edge, (0, 0, tw, 1))
+        if not mask & DOWN:
+            surface.fill(edge, (0, tw - 1, tw, 1))
+        if not mask & LEFT:
+            surface.fill(edge, (0, 0, 1, tw))
+        if not mask & RIGHT:
+            surface.fill(edge, (tw - 1, 0, 1, tw))
+        return surface
+
+    def sprite(self, key):
+        """Sprite for key = (tile_id << 8) | (mask << 4) | light level."""
+        sprite = self.shaded.get(key)
+        if sprite is None:
+            sprite = self._shade(key >> 8, (key >> 4) & 15, key & 15)
+            self.shaded[key] = sprite
+        return sprite
+
+    def _shade(self, tile_id, mask, level):
+        tw = self.tile_size
+        lit = self.base[tile_id][mask].copy()
+        v = int(255 * BRIGHTNESS[level])
+        lit.fill((v, v, v, 255), special_flags=pygame.BLEND_RGBA_MULT)
+        # flatten onto the colorkey: colorkey blits are much cheaper than alpha,
+        # and fully opaque sprites need no key at all
+        sprite = pygame.Surface((tw, tw))
+        sprite.fill(COLORKEY)
+        sprite.blit(lit, (0, 0))
+        if pygame.mask.from_surface(lit, 254).count() < tw * tw:
+            sprite.set_colorkey(COLORKEY)
+        return sprite
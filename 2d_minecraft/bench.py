@@ -0,0 +1,793 @@
+"""Micro-benchmarks for the 2d_minecraft world
+
+Usage:
+    python bench.py storage [--width W] [--height H] [--reads N] [--lit-writes N]
+    python bench.py draw [--frames N] [--tile T]
+    python bench.py generate [--width W] [--height H] [--workers N]
+    python bench.py collision [--updates N]
+    python bench.py sim [--ticks N] [--frames N]
+    python bench.py lighting [--edits N]
+    python bench.py stream [--frames N] [--speed PX]
+    python bench.py cellular [--steps N]
+    python bench.py entities [--count N] [--ticks N]
+    python bench.py minimap [--columns N] [--frames N]
+    python bench.py raycast [--casts N]
+    python bench.py edits
+    python bench.py save [--frames N]
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+from tiles import TileType, TILE_IDS
+from world import World
+from player import Camera, Player
+from chunk import CHUNK_SIZE, CHUNK_SHIFT, CHUNK_MASK
+from terrain import TerrainGenerator, generate_parallel, cave_mask, ore_tiles
+from headless import make_simulation, NO_KEYS
+from entities import Mob, Projectile, ItemDrop
+from minimap import Minimap
+
+
+def _measure(build):
+    """Return (result, bytes allocated, seconds) for build().
+
+    The timing comes from a separate untraced run because tracemalloc slows
+    down allocation-heavy code several times over.
+    """
+    t0 = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    result = build()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def bench_storage(args):
+    w, h = args.width, args.height
+    print(f'tile storage, {w}x{h} tiles')
+
+    def build_lists():
+        # the old layout: one list of TileType references per column
+        tiles = [[TileType.AIR for _ in range(h)] for _ in range(w)]
+        for x in range(w):
+            col = tiles[x]
+            for y in range(h // 3, h):
+                col[y] = TileType.STONE
+        return tiles
+
+    lists, list_bytes, list_build = _measure(build_lists)
+    def build_chunks():
+        world = World(width=w, height=h, seed=0)
+        world.load_columns(0, (w + CHUNK_SIZE - 1) // CHUNK_SIZE)
+        return world
+
+    world, chunk_bytes, chunk_build = _measure(build_chunks)
+    print(f'  list-of-lists: {list_bytes / 1e6:8.2f} MB  (built in {list_build:.2f}s)')
+    print(f'  chunks:        {chunk_bytes / 1e6:8.2f} MB  (built and generated in {chunk_build:.2f}s)')
+
+    rng = random.Random(0)
+    coords = [(rng.randrange(w), rng.randrange(h)) for _ in range(args.reads)]
+
+    t0 = time.perf_counter()
+    for tx, ty in coords:
+        lists[tx][ty].is_solid
+    list_read = time.perf_counter() - t0
+
+    get_tile = world.get_tile
+    t0 = time.perf_counter()
+    for tx, ty in coords:
+        get_tile(tx, ty).is_solid
+    chunk_read = time.perf_counter() - t0
+
+    # the write into the chunk's ids alone, as in list-of-lists[tx][ty] = tile
+    chunks = world.chunks
+    stone = TILE_IDS[TileType.STONE]
+    t0 = time.perf_counter()
+    for tx, ty in coords:
+        chunks[(tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT)].ids[((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)] = stone
+    raw_write = time.perf_counter() - t0
+
+    # set_tile also keeps revisions, and unless told not to, sand and light up to date
+    set_tile = world.set_tile
+    t0 = time.perf_counter()
+    for tx, ty in coords:
+        set_tile(tx, ty, TileType.DIRT, wake=False, relight=False)
+    chunk_write = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    world.relight()
+    relight = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for tx, ty in coords[:args.lit_writes]:
+        set_tile(tx, ty, TileType.STONE)
+    lit_write = time.perf_counter() - t0
+
+    n = len(coords)
+    print(f'  random read, list-of-lists:                 {list_read / n * 1e9:9.0f} ns/tile')
+    print(f'  random read, get_tile:                      {chunk_read / n * 1e9:9.0f} ns/tile')
+    print(f'  random write, chunk ids:                    {raw_write / n * 1e9:9.0f} ns/tile')
+    print(f'  random write, set_tile, no light or waking: {chunk_write / n * 1e9:9.0f} ns/tile '
+          f'(then relight(), {relight:.2f} s for the whole world)')
+    print(f'  random write, set_tile with light and waking:{lit_write / args.lit_writes * 1e9:9.0f} ns/tile '
+          f'(lighting, see bench.py lighting)')
+
+
+def _draw_tiles(world, surface, camera):
+    """The old World.draw: two draw.rect calls per visible tile."""
+    tw = world.tile_size
+    cols = surface.get_width() // tw + 3
+    rows = surface.get_height() // tw + 3
+    start_x = max(0, camera.x // tw - cols//2)
+    start_y = max(0, camera.y // tw - rows//2)
+    for i in range(start_x, min(world.width, start_x + cols)):
+        for j in range(start_y, min(world.height, start_y + rows)):
+            tile = world.get_tile(i, j)
+            if tile != TileType.AIR:
+                rect = pygame.Rect((i * tw) - camera.x + surface.get_width()//2,
+                                   (j * tw) - camera.y + surface.get_height()//2,
+                                   tw, tw)
+                pygame.draw.rect(surface, tile.color, rect)
+                pygame.draw.rect(surface, (0,0,0), rect, 1)
+
+
+def bench_draw(args):
+    pygame.init()
+    surface = pygame.Surface((800, 600))
+    world = World(width=400, height=120, tile_size=args.tile, seed=0)
+    # look at the ground line so roughly half the screen is solid
+    camera = Camera(200 * args.tile, world.generator.surface_height(200) * args.tile)
+    print(f'World.draw, 800x600 surface, {args.tile}px tiles, {args.frames} frames')
+
+    def run(draw, scroll):
+        t0 = time.perf_counter()
+        for frame in range(args.frames):
+            camera.x = 200 * args.tile + (frame * 4 if scroll else 0)
+            surface.fill((135, 206, 235))
+            draw(world, surface, camera)
+        return (time.perf_counter() - t0) / args.frames * 1000
+
+    print(f'  per-tile rects:          {run(_draw_tiles, False):7.3f} ms/frame')
+    world.draw(surface, camera)  # warm the chunk cache
+    print(f'  cached chunks (static):  {run(World.draw, False):7.3f} ms/frame')
+    print(f'  cached chunks (panning): {run(World.draw, True):7.3f} ms/frame')
+
+    # cost of re-rendering one chunk after an edit
+    chunks = [c for c in world.chunks.values() if any(c.ids)]
+    target = pygame.Surface((CHUNK_SIZE * args.tile, CHUNK_SIZE * args.tile))
+    tw = args.tile
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        target.fill((255, 0, 255))
+        for i, tile_id in enumerate(chunk.ids):
+            if tile_id:
+                rect = pygame.Rect((i >> 5) * tw, (i & 31) * tw, tw, tw)
+                pygame.draw.rect(target, (120, 120, 120), rect)
+                pygame.draw.rect(target, (0,0,0), rect, 1)
+    rects = (time.perf_counter() - t0) / len(chunks) * 1000
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        world.renderer._render(chunk, target)
+    atlas = (time.perf_counter() - t0) / len(chunks) * 1000
+    print(f'  chunk re-render, rects:  {rects:7.3f} ms/chunk')
+    print(f'  chunk re-render, atlas:  {atlas:7.3f} ms/chunk')
+
+
+def _legacy_heightmap(width, height):
+    """The original eager World.generate_heightmap, one tile at a time."""
+    tiles = [[TileType.AIR for _ in range(height)] for _ in range(width)]
+    ground_height = height // 3
+    noise = [0] * width
+    for x in range(width):
+        if x == 0:
+            noise[x] = ground_height
+        else:
+            noise[x] = max(3, noise[x-1] + random.randint(-1, 2))
+    for x in range(width):
+        h = min(height-1, noise[x] + random.randint(0, 3))
+        for y in range(height):
+            if y >= h:
+                if y == h:
+                    tiles[x][y] = TileType.GRASS
+                elif y < h + 4:
+                    tiles[x][y] = TileType.DIRT
+                else:
+                    tiles[x][y] = TileType.STONE
+    return tiles
+
+
+def bench_generate(args):
+    w, h = args.width, args.height
+    print(f'terrain generation, {w}x{h} tiles ({w * h / 1e6:.1f}M tiles)')
+
+    def report(name, seconds):
+        print(f'  {name:<28} {seconds:7.2f}s  {w * h / seconds / 1e6:7.1f}M tiles/s')
+
+    if not args.skip_legacy:
+        t0 = time.perf_counter()
+        _legacy_heightmap(w, h)
+        report('per-tile loop (original)', time.perf_counter() - t0)
+
+    generator = TerrainGenerator(0, h)
+    t0 = time.perf_counter()
+    for x in range(0, w, 2048):
+        cave_mask(0, x, 0, min(2048, w - x), h)
+        ore_tiles(0, generator.ground, x, 0, min(2048, w - x), h)
+    report('cave and ore stage alone', time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for cx in range(0, w // CHUNK_SIZE):
+        for cy in range((h + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            generator.generate_chunk(cx, cy)
+    report('generate_chunk, one chunk', time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for cx in range(0, w // CHUNK_SIZE):
+        generator.generate_column(cx, (h + CHUNK_SIZE - 1) // CHUNK_SIZE)
+    report('generate_column, lazy path', time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    generator.generate_region(0, w)
+    report('generate_region, 1 process', time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    generate_parallel(0, h, 0, w, workers=args.workers)
+    workers = args.workers or os.cpu_count()
+    report(f'generate_parallel, {workers} workers', time.perf_counter() - t0)
+
+
+def _arena(tile_size=32):
+    """Empty 64x64 world with a one-tile floor at row 40 and wall at column 40."""
+    world = World(width=64, height=64, tile_size=tile_size, seed=0)
+    world.load_columns(0, 2)
+    for chunk in world.chunks.values():
+        chunk.ids[:] = bytes(len(chunk.ids))
+    for t in range(64):
+        world.set_tile(t, 40, TileType.STONE, relight=False)
+        world.set_tile(40, t, TileType.STONE, relight=False)
+    world.relight()
+    return world
+
+
+def _legacy_update(player, dt):
+    """The original Player.update: corner sampling of the destination box."""
+    def collides_at(px, py):
+        tw = player.tile_size
+        left = int(px - player.width//2)
+        right = int(px + player.width//2 - 1)
+        top = int(py - player.height)
+        bottom = int(py - 1)
+        for sx in (left, right):
+            for sy in (top, bottom):
+                if player.world.get_tile(sx // tw, sy // tw).is_solid:
+                    return True
+        return False
+
+    player.vy += 1000 * dt
+    nx = player.x + player.vx * dt
+    ny = player.y + player.vy * dt
+    if not collides_at(nx, player.y):
+        player.x = nx
+    else:
+        player.vx = 0
+    if not collides_at(player.x, ny):
+        player.y = ny
+        player.on_ground = False
+    else:
+        if player.vy > 0:
+            player.on_ground = True
+        player.vy = 0
+
+
+def bench_collision(args):
+    tw = 32
+    world = _arena(tw)
+    floor_y, wall_x = 40 * tw, 40 * tw
+    print(f'player vs one-tile floor and wall, {args.updates} updates per case')
+
+    def fire(update, dt, height):
+        """Drop the player onto the floor and fire it at the wall."""
+        tunneled = 0
+        t0 = time.perf_counter()
+        for i in range(args.updates):
+            player = Player(20 * tw, 10 * tw, world, tile_size=tw)
+            player.height = height
+            player.vx = 2000 + i % 7 * 1000
+            player.vy = 3000 + i % 5 * 1000
+            update(player, dt)
+            update(player, dt)
+            if player.y > floor_y or player.x + player.width//2 > wall_x:
+                tunneled += 1
+        per_update = (time.perf_counter() - t0) / (2 * args.updates) * 1e6
+        return tunneled, per_update
+
+    for height in (int(tw * 1.6), tw * 3):
+        for dt in (1 / 60, 0.1, 0.5, 2.0):
+            old = fire(_legacy_update, dt, height)
+            new = fire(Player.update, dt, height)
+            print(f'  height {height:3d}px dt {dt:5.3f}s: '
+                  f'corner sampling {old[0]:5d} tunneled {old[1]:6.1f} us/update | '
+                  f'swept {new[0]:5d} tunneled {new[1]:6.1f} us/update')
+            assert new[0] == 0, 'swept collision let the player through'
+
+    # a lone block at waist height of a 3-tile player, between its corners
+    world.set_tile(30, 38, TileType.STONE)
+    for name, update in (('corner sampling', _legacy_update), ('swept', Player.update)):
+        player = Player(25 * tw, floor_y, world, tile_size=tw)
+        player.height = tw * 3
+        for _ in range(120):
+            player.vx = 200
+            update(player, 1 / 60)
+        passed = player.x + player.width//2 > 30 * tw
+        print(f'  3-tile player vs waist-high block, {name}: {"passed through" if passed else "stopped"}')
+
+
+def bench_sim(args):
+    sim = make_simulation(seed=0)
+    sim.run(60)  # load the spawn area first
+    t0 = time.perf_counter()
+    sim.run(args.ticks)
+    elapsed = time.perf_counter() - t0
+    print(f'headless simulation, {args.ticks} ticks walking right')
+    print(f'  {args.ticks / elapsed:10.0f} ticks/s  ({args.ticks * sim.step / elapsed:.0f}x real time)')
+
+    pygame.init()
+    for size in ((800, 600), (1920, 1080)):
+        surface = pygame.Surface(size)
+        sim.world.draw(surface, sim.player.camera)
+        t0 = time.perf_counter()
+        for _ in range(args.frames):
+            sim.tick()
+            surface.fill((135, 206, 235))
+            sim.world.draw(surface, sim.player.camera)
+        per_frame = (time.perf_counter() - t0) / args.frames * 1000
+        print(f'  tick + World.draw to off-screen {size[0]}x{size[1]}: {per_frame:6.3f} ms/frame')
+
+    print('  generation (World.load_columns, 256 tall):')
+    for width in (1000, 10000, 100000):
+        world = World(height=256, seed=0)
+        t0 = time.perf_counter()
+        world.load_columns(0, width // CHUNK_SIZE)
+        print(f'    {width:7d} columns: {time.perf_counter() - t0:6.2f}s')
+
+
+def bench_lighting(args):
+    world = World(height=256, seed=0)
+    t0 = time.perf_counter()
+    world.load_columns(0, 16)
+    print(f'lighting, 256-tall world')
+    print(f'  initial light per chunk column: {(time.perf_counter() - t0) / 16 * 1000:7.2f} ms '
+          f'(including generation)')
+    rng = random.Random(0)
+    xs = [rng.randrange(64, 448) for _ in range(args.edits)]
+    surface = world.generator.surface_height
+
+    def run(name, edit):
+        t0 = time.perf_counter()
+        for x in xs:
+            edit(x)
+        per_edit = (time.perf_counter() - t0) / (2 * len(xs)) * 1000
+        print(f'  {name:<34} {per_edit:7.3f} ms/edit')
+
+    def dig_surface(x):
+        y = surface(x)
+        world.set_tile(x, y, TileType.AIR)
+        world.set_tile(x, y, TileType.GRASS)
+
+    def block_sky(x):
+        # shades the whole column below it, the most expensive edit
+        world.set_tile(x, 5, TileType.DIRT)
+        world.set_tile(x, 5, TileType.AIR)
+
+    def dig_underground(x):
+        y = surface(x) + 40
+        world.set_tile(x, y, TileType.AIR)
+        world.set_tile(x, y, TileType.STONE)
+
+    def torch_cave(x):
+        y = surface(x) + 40
+        world.set_tile(x, y, TileType.TORCH)
+        world.set_tile(x, y, TileType.STONE)
+
+    run('dig and refill surface tile', dig_surface)
+    run('place and remove block in the sky', block_sky)
+    run('dig and refill underground tile', dig_underground)
+    run('place and remove torch underground', torch_cave)
+
+    # the incremental updates have to end where lighting from scratch does
+    edits, differ = 2 * args.edits, 0
+    for seed in range(3):
+        world = World(height=256, seed=seed)
+        world.load_columns(0, 5)
+        rng = random.Random(seed)
+        tiles = list(TileType)
+        for _ in range(edits):
+            world.set_tile(rng.randrange(5 * CHUNK_SIZE), rng.randrange(256), rng.choice(tiles))
+        light = {key: bytes(chunk.light) for key, chunk in world.chunks.items()}
+        world.lighting.light_columns(0, 5)
+        differ += sum(np.count_nonzero(np.frombuffer(light[key], dtype=np.uint8) !=
+                                       np.frombuffer(chunk.light, dtype=np.uint8))
+                      for key, chunk in world.chunks.items())
+    print(f'  after {edits} random edits on 3 seeds, {differ} tiles lit differently '
+          f'from a relight from scratch')
+
+
+def _percentile(sorted_times, p):
+    return sorted_times[min(len(sorted_times) - 1, int(len(sorted_times) * p))]
+
+
+def bench_stream(args):
+    pygame.init()
+    size = (800, 600)
+    surface = pygame.Surface(size)
+    print(f'frame time while flying right at {args.speed} px/s, 256-tall world, {args.frames} frames')
+    for label, threads in (('inline generation', 0), ('background worker', 2)):
+        world = World(height=256, seed=0)
+        if threads:
+            world.start_worker(threads)
+        camera = Camera(0, 64 * world.tile_size)
+        world.stream(camera, size)
+        times = []
+        for frame in range(args.frames):
+            t0 = time.perf_counter()
+            camera.x += args.speed / 60
+            world.stream(camera, size)
+            world.integrate(budget=0.004)
+            surface.fill((135, 206, 235))
+            world.draw(surface, camera)
+            times.append(time.perf_counter() - t0)
+            # pace like a 60 FPS game so the worker gets the idle time
+            time.sleep(max(0.0, 1 / 60 - times[-1]))
+        world.close()
+        # the first frames render the spawn area either way
+        times = sorted(times[30:])
+        print(f'  {label:<18} p50 {_percentile(times, 0.5) * 1000:6.2f} ms  '
+              f'p99 {_percentile(times, 0.99) * 1000:6.2f} ms  max {times[-1] * 1000:6.2f} ms')
+
+
+def bench_cellular(args):
+    # light is settled once per step, so the cost is mostly the per-cell rules and waking
+    print('falling sand: a block of sand dropped from the sky, cost per step')
+    print(f'  {"world columns":>13} {"awake cells":>11} {"ms/step":>9} {"us/cell":>9}')
+    for columns in (8, 128):
+        for count in (250, 1000, 4000):
+            world = World(height=60, seed=0)
+            world.load_columns(0, columns)
+            for i in range(count):
+                world.set_tile(i // 16, i % 16, TileType.SAND, relight=False)
+            world.relight()
+            awake = elapsed = 0
+            for _ in range(args.steps):
+                awake += len(world.cellular.active)
+                t0 = time.perf_counter()
+                world.cellular.step()
+                elapsed += time.perf_counter() - t0
+            print(f'  {columns:>13} {awake // args.steps:>11} {elapsed / args.steps * 1000:9.2f} '
+                  f'{elapsed / awake * 1e6:9.2f}')
+        while world.cellular.active:
+            world.cellular.step()
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            world.cellular.step()
+        print(f'  {columns:>13} {0:>11} {(time.perf_counter() - t0):9.4f}   (everything settled)')
+
+
+def _spawn_crowd(sim, count, rng):
+    """Scatter mobs, drops and projectiles over the loaded columns."""
+    world, tw = sim.world, sim.world.tile_size
+    columns = sorted(tx for tx, top in world.lighting.tops.items() if top < world.height)
+    tiles = list(TileType)[1:]
+    for i in range(count):
+        tx = rng.choice(columns)
+        x = tx * tw + tw / 2
+        y = (world.lighting.tops[tx] - rng.randrange(1, 6)) * tw
+        kind = i % 10
+        if kind < 5:
+            entity = Mob(x, y, tw, rng.choice((-1, 1)))
+        elif kind < 9:
+            entity = ItemDrop(x, y, tw, rng.choice(tiles))
+        else:
+            entity = Projectile(x, y, tw, rng.uniform(-400, 400), rng.uniform(-300, 0))
+        world.entities.spawn(entity)
+
+
+def bench_entities(args):
+    rng = random.Random(0)
+    sim = make_simulation(seed=0, script=lambda tick: NO_KEYS)
+    sim.run(60)
+    _spawn_crowd(sim, args.count, rng)
+    entities = sim.world.entities
+    times = []
+    updates = 0
+    for _ in range(args.ticks):
+        t0 = time.perf_counter()
+        sim.tick()
+        times.append(time.perf_counter() - t0)
+        updates += entities.updated
+    times.sort()
+    mean = sum(times) / len(times)
+    print(f'{args.count} entities, player standing still, {args.ticks} ticks')
+    print(f'  {1 / mean:8.0f} ticks/s  mean {mean * 1000:.2f} ms  p99 {_percentile(times, 0.99) * 1000:.2f} ms')
+    print(f'  {updates / args.ticks:8.0f} entity updates per tick, {len(entities)} entities left')
+
+    # every entity asks what overlaps its box, through the grid and by brute force
+    sample = [e for e in entities.entities if e.alive]
+    t0 = time.perf_counter()
+    hashed = 0
+    for e in sample:
+        hashed += sum(1 for _ in entities.overlapping(e.x - e.width / 2, e.y - e.height,
+                                                      e.x + e.width / 2, e.y))
+    grid_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    brute = 0
+    for e in sample:
+        left, top, right, bottom = e.x - e.width / 2, e.y - e.height, e.x + e.width / 2, e.y
+        for o in sample:
+            if o.x - o.width / 2 < right and o.x + o.width / 2 > left and o.y - o.height < bottom and o.y > top:
+                brute += 1
+    brute_time = time.perf_counter() - t0
+    print(f'  overlap queries for {len(sample)} entities: spatial hash {grid_time * 1000:.1f} ms, '
+          f'all pairs {brute_time * 1000:.1f} ms ({hashed} / {brute} overlaps found)')
+
+
+def bench_minimap(args):
+    pygame.init()
+    width = args.columns
+    world = World(height=60, seed=0)
+    t0 = time.perf_counter()
+    world.pregenerate(0, -(-width // CHUNK_SIZE))
+    print(f'map of a {width}-column world (generated and lit in {time.perf_counter() - t0:.1f}s)')
+    minimap = Minimap(world)
+    t0 = time.perf_counter()
+    minimap.refresh()
+    print(f'  chunk images for {len(world.chunks)} chunks: {(time.perf_counter() - t0) * 1000:.1f} ms')
+    screen = pygame.Surface((800, 600))
+
+    def per_frame(draw):
+        t0 = time.perf_counter()
+        for _ in range(args.frames):
+            draw()
+        return (time.perf_counter() - t0) / args.frames * 1000
+
+    camera = Camera(width * world.tile_size // 2, 30 * world.tile_size)
+    world.draw(screen, camera)
+    print(f'  {"normal view (World.draw)":<34} {per_frame(lambda: world.draw(screen, camera)):7.3f} ms/frame')
+    center = (width / 2, 30)
+    for level in range(0, 6):
+        t0 = time.perf_counter()
+        minimap.draw(screen, screen.get_rect(), center, level)
+        first = (time.perf_counter() - t0) * 1000
+        cached = per_frame(lambda: minimap.draw(screen, screen.get_rect(), center, level))
+        shown = min(width, 800 << level)
+        print(f'  {f"map level {level} ({shown} columns shown)":<34} {cached:7.3f} ms/frame  (first {first:.1f} ms)')
+
+    # the same whole-world view without the pyramid: every chunk image scaled down
+    full = pygame.Surface((width, 64))
+
+    def unmipped():
+        for (cx, cy), chunk in world.chunks.items():
+            full.blit(minimap.tile_surface(0, cx, cy), (cx * CHUNK_SIZE, cy * CHUNK_SIZE))
+        pygame.transform.smoothscale(full, (800, 64 * 800 // width))
+    print(f'  {"whole world, level 0 then scaled":<34} {per_frame(unmipped):7.3f} ms/frame')
+
+    # one rect per tile, like the main view used to be drawn
+    def rects():
+        for tx in range(width // 2 - 96, width // 2 + 96):
+            for ty in range(0, 60):
+                pygame.draw.rect(screen, world.get_tile(tx, ty).color[:3], (tx % 192, ty, 1, 1))
+    print(f'  {"192x60 minimap, rect per tile":<34} {per_frame(rects):7.3f} ms/frame')
+    print(f'  {"192x128 minimap overlay":<34} '
+          f'{per_frame(lambda: minimap.draw(screen, (0, 0, 192, 128), center, 0)):7.3f} ms/frame')
+
+
+def bench_raycast(args):
+    world = World(height=60, seed=0)
+    world.load_columns(0, 8)
+    tw = world.tile_size
+    rng = random.Random(0)
+    rays = []
+    for _ in range(args.casts):
+        x0, y0 = rng.uniform(2 * tw, 250 * tw), rng.uniform(2 * tw, 58 * tw)
+        angle = rng.uniform(0, 2 * math.pi)
+        rays.append((x0, y0, x0 + math.cos(angle) * 1e4, y0 + math.sin(angle) * 1e4))
+    print(f'block picking raycast, {args.casts} random rays')
+    # in an empty world every ray runs to its full reach
+    for name, empty in (('terrain', False), ('open air', True)):
+        if empty:
+            for chunk in world.chunks.values():
+                chunk.ids[:] = bytes(len(chunk.ids))
+        for reach in (6, 24, 96):
+            cast = world.ray.cast
+            t0 = time.perf_counter()
+            for x0, y0, x1, y1 in rays:
+                cast(x0, y0, x1, y1, reach * tw)
+            per_cast = (time.perf_counter() - t0) / len(rays) * 1e6
+            tracemalloc.start()
+            for x0, y0, x1, y1 in rays[:1000]:
+                cast(x0, y0, x1, y1, reach * tw)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'  {name:<9} reach {reach:3d} tiles: {per_cast:7.2f} us/cast, '
+                  f'peak traced memory over 1000 casts {peak} bytes')
+
+
+def bench_edits(args):
+    world = World(height=256, seed=0)
+    world.load_columns(-2, 30)
+    print('bulk edits in a 256-tall world')
+
+    def timed(name, edit):
+        t0 = time.perf_counter()
+        edit()
+        elapsed = time.perf_counter() - t0
+        print(f'  {name:<40} {elapsed * 1000:8.1f} ms')
+        return elapsed
+
+    def fill():
+        with world.edit() as batch:
+            batch.fill(10, 20, 410, 270, TileType.STONE)
+    timed('fill 400x250 (100,000 tiles), batched', fill)
+    runs = world.history.done[-1]
+    size = sum(len(old) + len(new) + 8 for _, r in runs for _, old, new in r)
+    print(f'  {"":<40} undo log: {sum(len(r) for _, r in runs)} runs, {size / 1024:.0f} KiB')
+    timed('undo', world.undo)
+    timed('redo', world.redo)
+    world.undo()
+
+    def per_tile():
+        for tx in range(10, 50):
+            for ty in range(20, 270):
+                world.set_tile(tx, ty, TileType.STONE)
+    per = timed('fill 40x250 (10,000 tiles), set_tile each', per_tile)
+
+    def per_tile_unlit():
+        for tx in range(10, 50):
+            for ty in range(20, 270):
+                world.set_tile(tx, ty, TileType.DIRT, relight=False)
+        world.relight()
+    print(f'  {"":<40} ~{per * 10000:.0f} ms for 100,000 tiles this way')
+    timed('same, set_tile(relight=False), one relight', per_tile_unlit)
+
+    def line():
+        with world.edit() as batch:
+            batch.line(0, 0, 900, 250, TileType.DIRT)
+    timed('line across 900 columns', line)
+
+    filled = []
+
+    def flood():
+        with world.edit() as batch:
+            filled.append(batch.flood(20, 5, TileType.WATER))
+    timed('flood the sky', flood)
+    print(f'  {"":<40} {filled[0]} tiles filled')
+
+
+def bench_save(args):
+    print('autosave of a 256-tall world with every loaded chunk edited')
+    print(f'  {"chunks":>7} {"blocking save":>14} {"snapshot pause":>15} '
+          f'{"worst edit frame while saving":>29} {"background":>11}')
+    rng = random.Random(0)
+    for columns in (16, 64, 256):
+        directory = tempfile.mkdtemp()
+        try:
+            world = World(height=256, seed=0, save_dir=directory)
+            world.load_columns(0, columns)
+            chunks = list(world.chunks.values())
+            for chunk in chunks:
+                chunk.dirty = True
+            # the old way: encode and write everything on the main thread
+            t0 = time.perf_counter()
+            for chunk in chunks:
+                world.store.save(chunk.cx, chunk.cy, chunk.ids)
+            world.store.flush()
+            blocking = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            world.save()
+            pause = time.perf_counter() - t0
+            # keep playing: a few edits per frame, some of them to chunks
+            # the saver hasn't reached yet, which copies them first
+            def frame():
+                t1 = time.perf_counter()
+                for _ in range(4):
+                    world.set_tile(rng.randrange(columns * CHUNK_SIZE), rng.randrange(256),
+                                   TileType.STONE, wake=False)
+                time.sleep(0.001)
+                return time.perf_counter() - t1 - 0.001
+            frames = []
+            while world.saver.pending and len(frames) < args.frames:
+                frames.append(frame())
+            world.saver.wait()
+            background = time.perf_counter() - t0
+            idle = [frame() for _ in frames]
+            print(f'  {len(chunks):>7} {blocking * 1000:>11.1f} ms {pause * 1000:>12.2f} ms '
+                  f'{max(frames) * 1000:>13.2f} ms ({max(idle) * 1000:5.2f} idle) '
+                  f'{background * 1000:>8.0f} ms')
+            world.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('storage', help='memory and access time of tile storage')
+    p.add_argument('--width', type=int, default=10000)
+    p.add_argument('--height', type=int, default=256)
+    p.add_argument('--reads', type=int, default=200000)
+    p.add_argument('--lit-writes', type=int, default=2000)
+    p.set_defaults(func=bench_storage)
+
+    p = sub.add_parser('draw', help='World.draw cost, per-tile rects vs cached chunks')
+    p.add_argument('--frames', type=int, default=300)
+    p.add_argument('--tile', type=int, default=32)
+    p.set_defaults(func=bench_draw)
+
+    p = sub.add_parser('generate', help='terrain generation throughput')
+    p.add_argument('--width', type=int, default=100000)
+    p.add_argument('--height', type=int, default=256)
+    p.add_argument('--workers', type=int, default=None)
+    p.add_argument('--skip-legacy', action='store_true',
+                   help="don't run the slow per-tile reference loop")
+    p.set_defaults(func=bench_generate)
+
+    p = sub.add_parser('collision', help='tunneling stress test and cost per Player.update')
+    p.add_argument('--updates', type=int, default=2000)
+    p.set_defaults(func=bench_collision)
+
+    p = sub.add_parser('sim', help='headless ticks/s, draw cost and generation time')
+    p.add_argument('--ticks', type=int, default=20000)
+    p.add_argument('--frames', type=int, default=600)
+    p.set_defaults(func=bench_sim)
+
+    p = sub.add_parser('lighting', help='incremental light update cost per edit')
+    p.add_argument('--edits', type=int, default=300)
+    p.set_defaults(func=bench_lighting)
+
+    p = sub.add_parser('stream', help='frame-time percentiles with and without the worker')
+    p.add_argument('--frames', type=int, default=600)
+    p.add_argument('--speed', type=float, default=1500)
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser('cellular', help='sand and water step cost against awake cells and world size')
+    p.add_argument('--steps', type=int, default=5)
+    p.set_defaults(func=bench_cellular)
+
+    p = sub.add_parser('entities', help='ticks/s with thousands of mobs, drops and projectiles')
+    p.add_argument('--count', type=int, default=5000)
+    p.add_argument('--ticks', type=int, default=600)
+    p.set_defaults(func=bench_entities)
+
+    p = sub.add_parser('minimap', help='map drawing cost at each zoom level')
+    p.add_argument('--columns', type=int, default=10000)
+    p.add_argument('--frames', type=int, default=100)
+    p.set_defaults(func=bench_minimap)
+
+    p = sub.add_parser('raycast', help='block picking cost against reach')
+    p.add_argument('--casts', type=int, default=20000)
+    p.set_defaults(func=bench_raycast)
+
+    p = sub.add_parser('edits', help='batched fill, undo and flood against per-tile edits')
+    p.set_defaults(func=bench_edits)
+
+    p = sub.add_parser('save', help='main loop pause of an autosave against the blocking save')
+    p.add_argument('--frames', type=int, default=100000)
+    p.set_defaults(func=bench_save)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
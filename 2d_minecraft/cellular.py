@@ -0,0 +1,194 @@
+"""Falling sand and flowing water
+
+Only cells that might move are simulated. Editing a tile wakes it and its
+eight neighbours; a cell that can't move this step goes back to sleep, and
+a cell that moves wakes the neighbourhood it left. The cost of a step is
+therefore proportional to the number of awake cells, not the size of the
+world.
+
+Rules, applied once per step:
+- sand falls into air or water below (swapping with the water), else slides
+  diagonally down when both the side and the tile below it are free
+- water falls into air, else flows diagonally down, else, while there is
+  more water on top of it, moves to the first air at either end of its row
+  of water; pools level out and a single layer of water stays put
+
+Chunks with many awake cells do the vertical falls with NumPy, a row of
+the chunk at a time from the bottom up, swapping the tiles in place;
+whatever didn't fall goes through the per-cell rules. Moves write
+straight into the chunks' ids, and the light is settled once at the end
+of the step: tile by tile for a few moves, by recomputing the touched
+columns for more, like an edit batch.
+"""
+import numpy as np
+from tiles import TileType, TILE_IDS
+from chunk import CHUNK_SHIFT, CHUNK_SIZE, CHUNK_MASK
+
+AIR = TILE_IDS[TileType.AIR]
+SAND = TILE_IDS[TileType.SAND]
+WATER = TILE_IDS[TileType.WATER]
+BLOCKED = 255  # stands in for unloaded or out of bounds tiles
+
+# ENTERS[mover][target]: tiles each moving tile can fall or flow into
+ENTERS = np.zeros((256, 256), dtype=bool)
+ENTERS[SAND, AIR] = ENTERS[SAND, WATER] = True
+ENTERS[WATER, AIR] = True
+MOVERS = bytes(1 if ENTERS[i].any() else 0 for i in range(256))
+# how far along a row water under pressure looks for room
+SPREAD = 16
+# awake cells in a chunk before its falls are done with NumPy
+DENSE = 64
+# steps moving at most this many tiles are relit tile by tile
+SMALL_STEP = 16
+
+
+class CellularAutomaton:
+    """Steps the awake falling and flowing tiles of a world."""
+    def __init__(self, world):
+        self.world = world
+        self.chunks = world.chunks
+        self.active = set()
+        self.steps = 0
+        self.moves = 0  # total tiles moved, for benchmarks
+        # tiles changed this step, as (chunk, index, tx, ty, old id, new id)
+        self._changes = []
+
+    def _id(self, tx, ty):
+        if ty < 0 or ty >= self.world.height:
+            return BLOCKED
+        if self.world.width is not None and not 0 <= tx < self.world.width:
+            return BLOCKED
+        chunk = self.chunks.get((tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT))
+        if chunk is None:
+            return BLOCKED
+        return chunk.ids[((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)]
+
+    def wake(self, tx, ty):
+        """Wake the moving tiles at and around (tx, ty)."""
+        for x in (tx - 1, tx, tx + 1):
+            for y in (ty - 1, ty, ty + 1):
+                if MOVERS[self._id(x, y)]:
+                    self.active.add((x, y))
+
+    def forget_column(self, cx):
+        self.active = {cell for cell in self.active if cell[0] >> CHUNK_SHIFT != cx}
+
+    def _write(self, tx, ty, tile_id):
+        chunk = self.chunks[(tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT)]
+        i = ((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)
+        chunk.unshare()
+        self._changes.append((chunk, i, tx, ty, chunk.ids[i], tile_id))
+        chunk.ids[i] = tile_id
+
+    def _move(self, x, y, nx, ny, moved):
+        # swap the two tiles; the target is either air or displaced water
+        a, b = self._id(x, y), self._id(nx, ny)
+        self._write(nx, ny, a)
+        self._write(x, y, b)
+        moved.add((nx, ny))
+        moved.add((x, y))
+        self.moves += 1
+
+    def _step_cell(self, x, y, tile_id):
+        """Where the tile at (x, y) moves this step, or None if it is settled."""
+        enters = ENTERS[tile_id]
+        if enters[self._id(x, y + 1)]:
+            return x, y + 1
+        # alternate the preferred side so piles and pools stay symmetric
+        first = 1 if (x + y + self.steps) & 1 else -1
+        for dx in (first, -first):
+            if enters[self._id(x + dx, y)] and enters[self._id(x + dx, y + 1)]:
+                return x + dx, y + 1
+        if tile_id == WATER and self._id(x, y - 1) == WATER:
+            # pushed by the water above: flow out to the end of this row of water
+            for dx in (first, -first):
+                for i in range(1, SPREAD + 1):
+                    side = self._id(x + dx * i, y)
+                    if side == AIR:
+                        return x + dx * i, y
+                    if side != WATER:
+                        break
+        return None
+
+    def _fall_dense(self, chunk, cells, moved):
+        """Vertical falls of one chunk's awake cells, a row of the chunk at a time."""
+        ids = np.frombuffer(chunk.ids, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+        awake = np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=bool)
+        lx = np.fromiter((x & CHUNK_MASK for x, _ in cells), dtype=np.intp, count=len(cells))
+        ly = np.fromiter((y & CHUNK_MASK for _, y in cells), dtype=np.intp, count=len(cells))
+        awake[lx, ly] = True
+        done = np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=bool)
+        falls = []
+        chunk.unshare()
+        # bottom rows first, so a falling stack moves as one, as in step(); the
+        # bottom row of the chunk is left to the per-cell rules
+        for y in range(CHUNK_SIZE - 2, -1, -1):
+            fall = awake[:, y] & ~done[:, y] & ENTERS[ids[:, y], ids[:, y + 1]]
+            if not fall.any():
+                continue
+            a, b = ids[fall, y], ids[fall, y + 1]
+            ids[fall, y], ids[fall, y + 1] = b, a
+            done[fall, y] = done[fall, y + 1] = True
+            falls.append((np.flatnonzero(fall), y, a, b))
+        x0, y0 = chunk.cx << CHUNK_SHIFT, chunk.cy << CHUNK_SHIFT
+        changes = self._changes
+        for xs, y, a, b in falls:
+            for lx, old, new in zip(xs.tolist(), a.tolist(), b.tolist()):
+                i = (lx << CHUNK_SHIFT) | y
+                x = x0 + lx
+                changes.append((chunk, i, x, y0 + y, old, new))
+                changes.append((chunk, i + 1, x, y0 + y + 1, new, old))
+                moved.add((x, y0 + y))
+                moved.add((x, y0 + y + 1))
+                self.moves += 1
+        return [cell for cell in cells if cell not in moved]
+
+    def _settle(self):
+        """Bump the revisions of the changed chunks and bring their light up to date."""
+        changes = self._changes
+        self._changes = []
+        if not changes:
+            return
+        lighting = self.world.lighting
+        for chunk in {change[0] for change in changes}:
+            chunk.revision += 1
+            chunk.dirty = True
+        if len(changes) <= 2 * SMALL_STEP:
+            # put the tiles back and redo them one at a time, exactly as set_tile would
+            for chunk, i, _, _, old, _ in reversed(changes):
+                chunk.ids[i] = old
+            for chunk, i, tx, ty, old, new in changes:
+                chunk.ids[i] = new
+                lighting.tile_changed(tx, ty, old, new)
+        else:
+            lighting.relight({chunk.cx for chunk, _, _, _, _, _ in changes})
+
+    def step(self):
+        """Advance every awake cell once; returns how many are still awake."""
+        cells = self.active
+        self.active = set()
+        moved = set()
+        if len(cells) >= DENSE:
+            by_chunk = {}
+            for x, y in cells:
+                by_chunk.setdefault((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT), []).append((x, y))
+            cells = []
+            for key, group in by_chunk.items():
+                chunk = self.chunks.get(key)
+                if chunk is not None and len(group) >= DENSE:
+                    group = self._fall_dense(chunk, group, moved)
+                cells.extend(group)
+        # bottom rows first, so a falling stack moves as one
+        for x, y in sorted(cells, key=lambda cell: -cell[1]):
+            tile_id = self._id(x, y)
+            if (x, y) in moved or not MOVERS[tile_id]:
+                continue
+            target = self._step_cell(x, y, tile_id)
+            if target is not None:
+                self._move(x, y, target[0], target[1], moved)
+        self._settle()
+        # everything that moved, and whatever was next to it, gets another look
+        near = {(x + dx, y + dy) for x, y in moved for dx in (-1, 0, 1) for dy in (-1, 0, 1)}
+        self.active.update(cell for cell in near if MOVERS[self._id(*cell)])
+        self.steps += 1
+        return len(self.active)
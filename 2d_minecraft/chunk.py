@@ -0,0 +1,44 @@
+"""Fixed-size chunk of tiles stored as one byte per tile"""
+from tiles import TILES, TILE_IDS
+
+CHUNK_SHIFT = 5
+CHUNK_SIZE = 1 << CHUNK_SHIFT  # 32x32 tiles per chunk
+CHUNK_MASK = CHUNK_SIZE - 1
+
+
+class Chunk:
+    """A CHUNK_SIZE x CHUNK_SIZE square of tile ids.
+
+    Ids are stored column-major in a bytearray, so the tile at local (lx, ly)
+    lives at index lx * CHUNK_SIZE + ly and a column is one contiguous slice.
+    `revision` is bumped on every edit so caches can tell when they are stale,
+    and `dirty` marks edits that have not been saved yet. `light` is filled
+    in by the lighting engine, which bumps `light_rev` when it changes.
+
+    `shared` is the Saver whose snapshot still refers to `ids`; anything that
+    writes to `ids` in place calls unshare() first.
+    """
+    __slots__ = ('cx', 'cy', 'ids', 'revision', 'dirty', 'light', 'light_rev', 'shared')
+
+    def __init__(self, cx, cy, ids=None):
+        self.cx = cx
+        self.cy = cy
+        self.ids = ids if ids is not None else bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        self.revision = 0
+        self.dirty = False
+        self.light = None
+        self.light_rev = 0
+        self.shared = None
+
+    def get(self, lx, ly):
+        return TILES[self.ids[(lx << CHUNK_SHIFT) | ly]]
+
+    def unshare(self):
+        if self.shared is not None:
+            self.shared.unshare(self)
+
+    def set(self, lx, ly, tile):
+        self.unshare()
+        self.ids[(lx << CHUNK_SHIFT) | ly] = TILE_IDS[tile]
+        self.revision += 1
+        self.dirty = True
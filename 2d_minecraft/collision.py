@@ -0,0 +1,73 @@
+"""Swept AABB vs tile grid collision
+
+Boxes are in world pixels: (left, top) is the top-left corner and the box
+covers [left, left + width) x [top, top + height). A box that only touches a
+tile face is not overlapping it, so sliding along a floor is not a hit.
+"""
+from tiles import SOLID
+
+
+def _span(start, end, tw):
+    """Tile indices covered by the half-open pixel interval [start, end)."""
+    return range(int(start // tw), -int(-end // tw))
+
+
+def _first_column_hit(world, left, top, width, height, dx, dy):
+    """Earliest time a vertical tile face stops the box, or None."""
+    tw = world.tile_size
+    if dx > 0:
+        edge = left + width
+        cols = range(-int(-edge // tw), -int(-(edge + dx) // tw))
+        face = 0
+    else:
+        edge = left
+        cols = range(int(edge // tw) - 1, int((edge + dx) // tw) - 1, -1)
+        face = 1
+    for c in cols:
+        t = ((c + face) * tw - edge) / dx
+        y = top + dy * t
+        for r in _span(y, y + height, tw):
+            if SOLID[world.tile_id(c, r)]:
+                return t
+    return None
+
+
+def _first_row_hit(world, left, top, width, height, dx, dy):
+    """Earliest time a horizontal tile face stops the box, or None."""
+    tw = world.tile_size
+    if dy > 0:
+        edge = top + height
+        rows = range(-int(-edge // tw), -int(-(edge + dy) // tw))
+        face = 0
+    else:
+        edge = top
+        rows = range(int(edge // tw) - 1, int((edge + dy) // tw) - 1, -1)
+        face = 1
+    for r in rows:
+        t = ((r + face) * tw - edge) / dy
+        x = left + dx * t
+        for c in _span(x, x + width, tw):
+            if SOLID[world.tile_id(c, r)]:
+                return t
+    return None
+
+
+def sweep(world, left, top, width, height, dx, dy):
+    """Move a box by (dx, dy) through the world's solid tiles.
+
+    Only the columns and rows the leading edges cross are visited, and every
+    tile the box spans along the other axis is checked, so boxes of any
+    height are handled. Returns (t, nx, ny): the fraction of the move that
+    is free (1.0 if nothing is hit) and the normal of the face that was hit,
+    (0, 0) when there is no contact.
+    """
+    t, nx, ny = 1.0, 0, 0
+    if dx:
+        hit = _first_column_hit(world, left, top, width, height, dx, dy)
+        if hit is not None and hit < t:
+            t, nx, ny = hit, (-1 if dx > 0 else 1), 0
+    if dy:
+        hit = _first_row_hit(world, left, top, width, height, dx, dy)
+        if hit is not None and hit < t:
+            t, nx, ny = hit, 0, (-1 if dy > 0 else 1)
+    return t, nx, ny
@@ -0,0 +1,289 @@
+"""Batched tile edits with undo and redo
+
+    with world.edit() as batch:
+        batch.fill(0, 10, 400, 260, TileType.STONE)
+        batch.line(0, 0, 50, 20, TileType.DIRT)
+
+A batch writes straight into the chunks' id arrays, one NumPy slice per
+chunk for rectangles, and settles everything that depends on the tiles
+when it ends: chunk revisions (and with them the render and map caches)
+are bumped once per chunk, light is recomputed once for the affected
+columns and nearby sand and water is woken. If the block raises, every
+chunk is put back the way it was.
+
+Committed batches go on the world's EditHistory as runs of consecutive
+changed tile indices per chunk, with the old and new ids of each run.
+"""
+import re
+import numpy as np
+from tiles import TILE_IDS
+from chunk import CHUNK_SHIFT, CHUNK_SIZE, CHUNK_MASK
+from cellular import MOVERS
+
+# batches changing at most this many tiles are relit tile by tile
+SMALL_BATCH = 32
+MOVER_TABLE = np.frombuffer(MOVERS, dtype=np.uint8).astype(bool)
+
+
+def _view(chunk):
+    return np.frombuffer(chunk.ids, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+
+
+class EditBatch:
+    """A group of edits that is applied, relit and undone as one."""
+    def __init__(self, world):
+        self.world = world
+        self.before = {}  # (cx, cy) -> ids of the chunk before its first edit
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.world.history.record(commit(self.world, self._runs()))
+        else:
+            for key, ids in self.before.items():
+                self.world.chunks[key].ids[:] = ids
+        return False
+
+    def _chunk(self, cx, cy):
+        chunk = self.world.get_chunk(cx, cy)
+        if (cx, cy) not in self.before:
+            chunk.unshare()
+            self.before[(cx, cy)] = bytes(chunk.ids)
+        return chunk
+
+    def _clip(self, x0, y0, x1, y1):
+        world = self.world
+        y0, y1 = max(0, y0), min(world.height, y1)
+        if world.width is not None:
+            x0, x1 = max(0, x0), min(world.width, x1)
+        return x0, y0, x1, y1
+
+    def set(self, tx, ty, tile):
+        if self.world.in_bounds(tx, ty):
+            chunk = self._chunk(tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT)
+            chunk.ids[((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)] = TILE_IDS[tile]
+
+    def fill(self, x0, y0, x1, y1, tile):
+        """Set every tile in columns x0..x1-1 and rows y0..y1-1."""
+        self.paste(x0, y0, np.full((max(0, x1 - x0), max(0, y1 - y0)), TILE_IDS[tile], dtype=np.uint8))
+
+    def paste(self, x0, y0, ids, skip_air=False):
+        """Copy a (width, rows) array of tile ids in with its corner at (x0, y0).
+
+        With `skip_air`, AIR in `ids` leaves the tile underneath alone.
+        """
+        w, h = ids.shape
+        tx0, ty0, tx1, ty1 = self._clip(x0, y0, x0 + w, y0 + h)
+        if tx0 >= tx1 or ty0 >= ty1:
+            return
+        for cx in range(tx0 >> CHUNK_SHIFT, ((tx1 - 1) >> CHUNK_SHIFT) + 1):
+            for cy in range(ty0 >> CHUNK_SHIFT, ((ty1 - 1) >> CHUNK_SHIFT) + 1):
+                # the part of the paste inside this chunk, in world tiles
+                ax, bx = max(tx0, cx << CHUNK_SHIFT), min(tx1, (cx + 1) << CHUNK_SHIFT)
+                ay, by = max(ty0, cy << CHUNK_SHIFT), min(ty1, (cy + 1) << CHUNK_SHIFT)
+                src = ids[ax - x0:bx - x0, ay - y0:by - y0]
+                dst = _view(self._chunk(cx, cy))[ax - (cx << CHUNK_SHIFT):bx - (cx << CHUNK_SHIFT),
+                                                ay - (cy << CHUNK_SHIFT):by - (cy << CHUNK_SHIFT)]
+                if skip_air:
+                    np.copyto(dst, src, where=src != 0)
+                else:
+                    dst[...] = src
+
+    def line(self, x0, y0, x1, y1, tile):
+        """Set the tiles of a Bresenham line from (x0, y0) to (x1, y1)."""
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x1 > x0 else -1), (1 if y1 > y0 else -1)
+        err = dx + dy
+        while True:
+            self.set(x0, y0, tile)
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def _column(self, tx):
+        """Chunks of world column tx from the top, and the index of tx in their ids."""
+        cx = tx >> CHUNK_SHIFT
+        start = (tx & CHUNK_MASK) << CHUNK_SHIFT
+        return [self._chunk(cx, cy) for cy in range(self.world.rows)], start
+
+    def flood(self, tx, ty, tile, limit=100000):
+        """Replace the 4-connected area of the same tile as (tx, ty), up to `limit` tiles.
+
+        The area doesn't spread into columns that aren't loaded. Works a
+        vertical span of tiles at a time; returns how many changed.
+        """
+        world = self.world
+        if not world.in_bounds(tx, ty):
+            return 0
+        target = bytes([world.tile_id(tx, ty)])
+        new = TILE_IDS[tile]
+        if target[0] == new:
+            return 0
+        run = re.compile(re.escape(target) + b'+')
+        stack = [(tx, ty)]
+        done = 0
+        while stack and done < limit:
+            x, y = stack.pop()
+            chunks, start = self._column(x)
+            column = b''.join(c.ids[start:start + CHUNK_SIZE] for c in chunks)[:world.height]
+            if column[y] != target[0]:
+                continue
+            # the run of target tiles through y, cut short at the limit
+            rest = column[y:]
+            top = len(column[:y].rstrip(target))
+            bottom = min(y + len(rest) - len(rest.lstrip(target)), top + limit - done)
+            for cy in range(top >> CHUNK_SHIFT, ((bottom - 1) >> CHUNK_SHIFT) + 1):
+                a = max(top, cy << CHUNK_SHIFT) - (cy << CHUNK_SHIFT)
+                b = min(bottom, (cy + 1) << CHUNK_SHIFT) - (cy << CHUNK_SHIFT)
+                chunks[cy].ids[start + a:start + b] = bytes([new]) * (b - a)
+            done += bottom - top
+            for nx in (x - 1, x + 1):
+                # the flood stays within the loaded columns
+                if not world.in_bounds(nx, top) or (nx >> CHUNK_SHIFT, 0) not in world.chunks:
+                    continue
+                nchunks, nstart = self._column(nx)
+                side = b''.join(c.ids[nstart:nstart + CHUNK_SIZE] for c in nchunks)
+                for m in run.finditer(side, top, bottom):
+                    stack.append((nx, m.start()))
+        return done
+
+    def _runs(self):
+        """[(key, [(start, old bytes, new bytes), ...]), ...] of every chunk that changed."""
+        changes = []
+        for key, old in self.before.items():
+            new = self.world.chunks[key].ids
+            diff = np.flatnonzero(np.frombuffer(old, dtype=np.uint8) != np.frombuffer(new, dtype=np.uint8))
+            if not len(diff):
+                continue
+            # split the changed indices where they stop being consecutive
+            breaks = np.flatnonzero(np.diff(diff) > 1) + 1
+            starts = np.concatenate(([diff[0]], diff[breaks]))
+            ends = np.concatenate((diff[breaks - 1], [diff[-1]])) + 1
+            changes.append((key, [(int(a), old[a:b], bytes(new[a:b])) for a, b in zip(starts, ends)]))
+        return changes
+
+
+def commit(world, changes, forward=True):
+    """Settle the world after `changes` (from EditBatch._runs) were written.
+
+    Returns `changes`. Also used by EditHistory after it writes them back.
+    """
+    count = sum(len(new) for _, runs in changes for _, _, new in runs)
+    if not count:
+        return changes
+    columns = set()
+    for (cx, cy), _ in changes:
+        chunk = world.chunks[(cx, cy)]
+        chunk.revision += 1
+        chunk.dirty = True
+        columns.add(cx)
+    if count <= SMALL_BATCH:
+        # put the tiles back and redo them one at a time, exactly as set_tile would
+        for (cx, cy), runs in changes:
+            ids = world.chunks[(cx, cy)].ids
+            for start, old, new in runs:
+                if not forward:
+                    old, new = new, old
+                ids[start:start + len(old)] = old
+        for (cx, cy), runs in changes:
+            ids = world.chunks[(cx, cy)].ids
+            for start, old, new in runs:
+                if not forward:
+                    old, new = new, old
+                for j in range(len(new)):
+                    i = start + j
+                    ids[i] = new[j]
+                    world.lighting.tile_changed((cx << CHUNK_SHIFT) | (i >> CHUNK_SHIFT),
+                                                (cy << CHUNK_SHIFT) | (i & CHUNK_MASK), old[j], new[j])
+    else:
+        world.lighting.relight(columns)
+    _wake(world, changes)
+    return changes
+
+
+def _has_movers(chunk, cache):
+    key = (chunk.cx, chunk.cy)
+    if key not in cache:
+        cache[key] = chunk.ids.translate(MOVERS).count(0) != len(chunk.ids)
+    return cache[key]
+
+
+def _wake(world, changes):
+    """Wake the sand and water in and around the changed tiles."""
+    active = world.cellular.active
+    movers = {}
+    for (cx, cy), runs in changes:
+        near = [world.chunks.get((nx, ny)) for nx in (cx - 1, cx, cx + 1) for ny in (cy - 1, cy, cy + 1)]
+        if not any(chunk is not None and _has_movers(chunk, movers) for chunk in near):
+            continue  # nothing that could start moving
+        changed = np.zeros(CHUNK_SIZE * CHUNK_SIZE, dtype=bool)
+        for start, _, new in runs:
+            changed[start:start + len(new)] = True
+        # grow the changed area by a tile, including into the neighbouring chunks
+        grown = np.zeros((CHUNK_SIZE + 2, CHUNK_SIZE + 2), dtype=bool)
+        changed = changed.reshape(CHUNK_SIZE, CHUNK_SIZE)
+        for dx in (0, 1, 2):
+            for dy in (0, 1, 2):
+                grown[dx:dx + CHUNK_SIZE, dy:dy + CHUNK_SIZE] |= changed
+        x0, y0 = (cx << CHUNK_SHIFT) - 1, (cy << CHUNK_SHIFT) - 1
+        for nx in (cx - 1, cx, cx + 1):
+            for ny in (cy - 1, cy, cy + 1):
+                chunk = world.chunks.get((nx, ny))
+                if chunk is None:
+                    continue
+                # the part of the grown area that lies in chunk (nx, ny)
+                ax, ay = (nx << CHUNK_SHIFT) - x0, (ny << CHUNK_SHIFT) - y0
+                sx = slice(max(0, ax), min(CHUNK_SIZE + 2, ax + CHUNK_SIZE))
+                sy = slice(max(0, ay), min(CHUNK_SIZE + 2, ay + CHUNK_SIZE))
+                if sx.start >= sx.stop or sy.start >= sy.stop:
+                    continue
+                ids = _view(chunk)[sx.start - ax:sx.stop - ax, sy.start - ay:sy.stop - ay]
+                lx, ly = np.nonzero(grown[sx, sy] & MOVER_TABLE[ids])
+                active.update(zip((lx + sx.start + x0).tolist(), (ly + sy.start + y0).tolist()))
+
+
+class EditHistory:
+    """Undo and redo stacks of committed batches."""
+    def __init__(self, limit=64):
+        self.limit = limit
+        self.undone = []
+        self.done = []
+
+    def record(self, changes):
+        if changes:
+            self.done.append(changes)
+            del self.done[:-self.limit]
+            self.undone.clear()
+
+    def _write(self, world, changes, forward):
+        for key, runs in changes:
+            # chunks unloaded since are brought back (from the save, if any)
+            chunk = world.get_chunk(*key)
+            chunk.unshare()
+            for start, old, new in runs:
+                chunk.ids[start:start + len(new)] = new if forward else old
+        commit(world, changes, forward)
+
+    def undo(self, world):
+        if not self.done:
+            return False
+        changes = self.done.pop()
+        self._write(world, changes, False)
+        self.undone.append(changes)
+        return True
+
+    def redo(self, world):
+        if not self.undone:
+            return False
+        changes = self.undone.pop()
+        self._write(world, changes, True)
+        self.done.append(changes)
+        return True
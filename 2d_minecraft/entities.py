@@ -0,0 +1,313 @@
+"""Mobs, projectiles and dropped items
+
+Entities are kept in a uniform grid spatial hash, so finding what overlaps
+a box only looks at the few cells around it instead of every entity. Cells
+are 1 << CELL_SHIFT tiles wide, which divides the chunk size, so every cell
+lies inside a single chunk.
+
+Entities away from the screen are updated every FAR_INTERVAL ticks with a
+step that much longer; motion is swept against the tiles, so long steps
+can't tunnel through walls. Entities in columns that aren't loaded are
+frozen until the column comes back.
+"""
+import random
+import pygame
+from collision import sweep
+from chunk import CHUNK_SHIFT
+from tiles import SOLID
+
+CELL_SHIFT = 2      # grid cells are 4x4 tiles
+FAR_INTERVAL = 4    # off-screen entities are updated every 4th tick
+GRAVITY = 1000
+MAX_MOBS = 8
+MOB_SPAWN_SECONDS = 5
+
+
+class SpatialHash:
+    """Entities bucketed by the grid cell that holds their position."""
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        # dicts rather than sets keep iteration order, and so the game, deterministic
+        self.cells = {}
+
+    def key(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, entity):
+        entity.cell = self.key(entity.x, entity.y)
+        self.cells.setdefault(entity.cell, {})[entity] = None
+
+    def remove(self, entity):
+        bucket = self.cells[entity.cell]
+        del bucket[entity]
+        if not bucket:
+            del self.cells[entity.cell]
+
+    def move(self, entity):
+        key = self.key(entity.x, entity.y)
+        if key != entity.cell:
+            self.remove(entity)
+            entity.cell = key
+            self.cells.setdefault(key, {})[entity] = None
+
+    def query(self, left, top, right, bottom):
+        """Entities whose position lies in a cell overlapping the box."""
+        cs = self.cell_size
+        for cx in range(int(left // cs), int(right // cs) + 1):
+            for cy in range(int(top // cs), int(bottom // cs) + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    yield from bucket
+
+
+class Entity:
+    """A box with velocity; x is the center and y the feet, like the player."""
+    __slots__ = ('x', 'y', 'vx', 'vy', 'width', 'height', 'on_ground', 'alive', 'cell', 'uid')
+    size = (0.5, 0.5)  # in tiles
+    color = (255, 255, 255)
+    gravity = GRAVITY
+
+    def __init__(self, x, y, tile_size, vx=0.0, vy=0.0):
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.width = max(2, int(tile_size * self.size[0]))
+        self.height = max(2, int(tile_size * self.size[1]))
+        self.on_ground = False
+        self.alive = True
+        self.cell = None
+        self.uid = 0
+
+    def move(self, world, dt):
+        """Fall and move through the tiles; returns (hit a wall, hit a floor or ceiling)."""
+        self.vy += self.gravity * dt
+        dx = self.vx * dt
+        dy = self.vy * dt
+        w, h = self.width, self.height
+        hit_x = False
+        if dx:
+            t, _, _ = sweep(world, self.x - w / 2, self.y - h, w, h, dx, 0)
+            self.x += dx * t
+            hit_x = t < 1.0
+        t, _, ny = sweep(world, self.x - w / 2, self.y - h, w, h, 0, dy)
+        self.y += dy * t
+        self.on_ground = t < 1.0 and ny < 0
+        if t < 1.0:
+            self.vy = 0
+        return hit_x, t < 1.0
+
+    def update(self, entities, player, dt):
+        self.move(entities.world, dt)
+
+    def draw(self, surface, left, top):
+        rect = (int(self.x - self.width / 2) - left, int(self.y - self.height) - top,
+                self.width, self.height)
+        pygame.draw.rect(surface, self.color, rect)
+
+
+class Mob(Entity):
+    """Wanders around and walks towards the player when it is close."""
+    __slots__ = ('direction', 'health', 'wander')
+    size = (0.8, 0.9)
+    color = (70, 160, 70)
+    speed = 60
+    sight = 8  # tiles
+
+    def __init__(self, x, y, tile_size, direction=1):
+        super().__init__(x, y, tile_size)
+        self.direction = direction
+        self.health = 3
+        self.wander = 0.0
+
+    def update(self, entities, player, dt):
+        reach = self.sight * entities.tile_size
+        if abs(player.x - self.x) < reach and abs(player.y - self.y) < reach:
+            self.direction = 1 if player.x > self.x else -1
+        else:
+            self.wander -= dt
+            if self.wander <= 0:
+                self.direction = entities.rng.choice((-1, 1))
+                self.wander = entities.rng.uniform(2, 6)
+        self.vx = self.direction * self.speed
+        hit_x, _ = self.move(entities.world, dt)
+        if hit_x and self.on_ground:
+            # hop up steps, turn around when that isn't enough
+            if self.vy == 0 and entities.rng.random() < 0.5:
+                self.vy = -330
+            else:
+                self.direction = -self.direction
+
+
+class Projectile(Entity):
+    """Flies in an arc and hurts the first mob it touches."""
+    __slots__ = ('life',)
+    size = (0.25, 0.25)
+    color = (240, 240, 240)
+    gravity = 400
+
+    def __init__(self, x, y, tile_size, vx, vy):
+        super().__init__(x, y, tile_size, vx, vy)
+        self.life = 3.0
+
+    def update(self, entities, player, dt):
+        self.life -= dt
+        hit_x, hit_y = self.move(entities.world, dt)
+        if hit_x or hit_y or self.life <= 0:
+            entities.kill(self)
+            return
+        for mob in entities.overlapping(self.x - self.width / 2, self.y - self.height,
+                                        self.x + self.width / 2, self.y, Mob):
+            mob.health -= 1
+            if mob.health <= 0:
+                entities.kill(mob)
+            entities.kill(self)
+            return
+
+
+class ItemDrop(Entity):
+    """A broken block waiting to be picked up; drops of the same tile merge."""
+    __slots__ = ('tile', 'count')
+    size = (0.4, 0.4)
+
+    def __init__(self, x, y, tile_size, tile, count=1):
+        super().__init__(x, y, tile_size, vy=-150)
+        self.tile = tile
+        self.count = count
+
+    @property
+    def color(self):
+        return self.tile.color
+
+    def update(self, entities, player, dt):
+        world = entities.world
+        tw = world.tile_size
+        if self.on_ground and SOLID[world.tile_id(int(self.x // tw), int(self.y // tw))]:
+            return  # resting on the ground, nothing to do
+        _, landed = self.move(world, dt)
+        if landed and self.on_ground:
+            for other in entities.overlapping(self.x - tw, self.y - tw, self.x + tw, self.y + tw,
+                                              ItemDrop):
+                if other is not self and other.tile == self.tile:
+                    other.count += self.count
+                    entities.kill(self)
+                    return
+
+
+class EntityManager:
+    """Updates and draws the entities of a world."""
+    def __init__(self, world, seed=None):
+        self.world = world
+        self.tile_size = world.tile_size
+        self.grid = SpatialHash(world.tile_size << CELL_SHIFT)
+        # largest half-extent of any entity, so box queries don't miss big ones
+        self.margin = world.tile_size
+        self.entities = []
+        self.rng = random.Random(world.seed if seed is None else seed)
+        self.ticks = 0
+        self.updated = 0  # entity updates in the last tick, for benchmarks
+        self._uid = 0
+        self._dead = 0
+        self._spawn_timer = MOB_SPAWN_SECONDS
+
+    def __len__(self):
+        return len(self.entities) - self._dead
+
+    def spawn(self, entity):
+        self._uid += 1
+        entity.uid = self._uid
+        self.entities.append(entity)
+        self.grid.insert(entity)
+        return entity
+
+    def kill(self, entity):
+        if entity.alive:
+            entity.alive = False
+            self.grid.remove(entity)
+            self._dead += 1
+
+    def overlapping(self, left, top, right, bottom, kind=Entity):
+        """Live entities of class `kind` whose boxes overlap the given box."""
+        m = self.margin
+        for e in list(self.grid.query(left - m, top - m, right + m, bottom + m)):
+            if (e.alive and isinstance(e, kind) and e.x - e.width / 2 < right
+                    and e.x + e.width / 2 > left and e.y - e.height < bottom and e.y > top):
+                yield e
+
+    def _spawn_mob(self, player, view_size):
+        # just off screen on a random side, standing on the ground
+        side = self.rng.choice((-1, 1))
+        tw = self.tile_size
+        tx = int((player.x + side * (view_size[0] // 2 + 2 * tw)) // tw)
+        top = self.world.lighting.tops.get(tx)
+        if top is None or top >= self.world.height:
+            return
+        self.spawn(Mob(tx * tw + tw / 2, top * tw, tw, -side))
+
+    def update(self, dt, player, view_size):
+        """Advance every entity by dt; off-screen ones only every FAR_INTERVAL ticks."""
+        self.ticks += 1
+        span = self.tile_size << CHUNK_SHIFT
+        loaded = {cx for cx, cy in self.world.chunks if cy == 0}
+        # the view plus a cell on each side runs at the full rate
+        pad = self.grid.cell_size
+        left = player.camera.x - view_size[0] // 2 - pad
+        right = player.camera.x + view_size[0] // 2 + pad
+        top = player.camera.y - view_size[1] // 2 - pad
+        bottom = player.camera.y + view_size[1] // 2 + pad
+        far_dt = dt * FAR_INTERVAL
+        phase = self.ticks % FAR_INTERVAL
+        updated = 0
+        for e in self.entities:
+            if not e.alive:
+                continue
+            if left <= e.x <= right and top <= e.y <= bottom:
+                step = dt
+            elif e.uid % FAR_INTERVAL == phase:
+                step = far_dt
+            else:
+                continue
+            cx = int(e.x // span)
+            if cx not in loaded or cx - 1 not in loaded or cx + 1 not in loaded:
+                continue  # frozen until its neighbourhood is loaded again
+            e.update(self, player, step)
+            if e.alive:
+                self.grid.move(e)
+            updated += 1
+        self.updated = updated
+
+        # pick up drops the player walks over
+        for item in self.overlapping(player.x - player.width / 2, player.y - player.height,
+                                     player.x + player.width / 2, player.y, ItemDrop):
+            player.inventory[item.tile] = player.inventory.get(item.tile, 0) + item.count
+            self.kill(item)
+
+        self._spawn_timer -= dt
+        if self._spawn_timer <= 0:
+            self._spawn_timer = MOB_SPAWN_SECONDS
+            if sum(1 for e in self.entities if e.alive and isinstance(e, Mob)) < MAX_MOBS:
+                self._spawn_mob(player, view_size)
+
+        if self._dead > len(self.entities) // 4:
+            self.entities = [e for e in self.entities if e.alive]
+            self._dead = 0
+
+    def drop(self, tx, ty, tile):
+        """Spawn the item of a broken tile at the tile's center."""
+        tw = self.tile_size
+        if not tile.replaceable:
+            self.spawn(ItemDrop(tx * tw + tw / 2, ty * tw + tw * 0.7, tw, tile))
+
+    def throw(self, player, wx, wy, speed=600):
+        """Throw a projectile from the player's chest towards world point (wx, wy)."""
+        x, y = player.x, player.y - player.height / 2
+        dx, dy = wx - x, wy - y
+        length = max(1e-6, (dx * dx + dy * dy) ** 0.5)
+        return self.spawn(Projectile(x, y, self.tile_size, dx / length * speed, dy / length * speed))
+
+    def draw(self, surface, camera):
+        sw, sh = surface.get_size()
+        left = int(camera.x) - sw // 2
+        top = int(camera.y) - sh // 2
+        for e in self.overlapping(left, top, left + sw, top + sh):
+            e.draw(surface, left, top)
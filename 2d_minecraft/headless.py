@@ -0,0 +1,68 @@
+"""Headless fixed-timestep simulation of the 2d_minecraft world
+
+Runs Player.update and the world at a fixed step from scripted key states,
+without a window and as fast as the CPU allows. Import this module before
+anything else that initialises pygame so SDL picks the dummy video driver.
+"""
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from world import World
+from player import Player
+
+STEP = 1 / 60
+
+
+class ScriptedKeys:
+    """Stands in for pygame.key.get_pressed() with a fixed set of held keys."""
+    def __init__(self, held=()):
+        self.held = frozenset(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+NO_KEYS = ScriptedKeys()
+RIGHT = ScriptedKeys((pygame.K_d,))
+RIGHT_JUMP = ScriptedKeys((pygame.K_d, pygame.K_SPACE))
+
+
+def walk_right(tick):
+    """Default input script: hold right and jump every 45 ticks."""
+    return RIGHT_JUMP if tick % 45 == 0 else RIGHT
+
+
+class Simulation:
+    """Steps a player through a world at a fixed timestep.
+
+    `script(tick)` returns the key state for that tick. `view_size` is the
+    screen size used to decide which chunks to keep loaded.
+    """
+    def __init__(self, world, player, script=walk_right, step=STEP, view_size=(800, 600)):
+        self.world = world
+        self.player = player
+        self.script = script
+        self.step = step
+        self.view_size = view_size
+        self.ticks = 0
+
+    def tick(self):
+        keys = self.script(self.ticks)
+        self.player.handle_input(keys, self.step)
+        self.player.update(self.step)
+        self.world.tick(self.step)
+        self.world.entities.update(self.step, self.player, self.view_size)
+        self.world.stream(self.player.camera, self.view_size)
+        self.ticks += 1
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.tick()
+
+
+def make_simulation(seed=0, height=60, tile_size=32, script=walk_right):
+    world = World(height=height, tile_size=tile_size, seed=seed)
+    player = Player(x=100, y=100, world=world, tile_size=tile_size)
+    return Simulation(world, player, script=script)
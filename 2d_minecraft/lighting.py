@@ -0,0 +1,247 @@
+"""Skylight and block light for the tile world
+
+Every chunk carries a `light` bytearray parallel to its tile ids, with the
+skylight level in the high nibble and block light in the low nibble (0-15).
+Tiles above the first opaque tile of their column are lit by the sky at full
+strength; tiles with a `light` value emit block light. Light spreads to the
+four neighbours, losing 1 per transparent tile and SOLID_FALLOFF per opaque
+tile, so it reaches a few tiles into the ground.
+
+Edits are relit incrementally with the usual two-queue flood fill: light
+that depended on the changed tile is removed first, then re-spread from the
+edge of the darkened area, so only the affected neighbourhood is touched.
+"""
+from collections import deque
+from tiles import OPAQUE, LIGHT
+from chunk import CHUNK_SHIFT, CHUNK_SIZE, CHUNK_MASK
+
+MAX_LIGHT = 15
+SKY = 4    # nibble shift of the skylight channel
+BLOCK = 0  # nibble shift of the block light channel
+SOLID_FALLOFF = 4
+
+# light lost entering a tile, by tile id
+COST = bytes(SOLID_FALLOFF if opaque else 1 for opaque in OPAQUE)
+
+
+class Lighting:
+    """Keeps the `light` arrays of a world's loaded chunks up to date."""
+    def __init__(self, world):
+        self.world = world
+        self.chunks = world.chunks
+        # row of the first opaque tile in each loaded column (world height if none)
+        self.tops = {}
+
+    def _locate(self, tx, ty):
+        if ty < 0 or ty >= self.world.height:
+            return None
+        chunk = self.chunks.get((tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT))
+        if chunk is None or chunk.light is None:
+            return None
+        return chunk, ((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)
+
+    def get_light(self, tx, ty):
+        """(skylight, block light) of a tile, zeros if it isn't loaded."""
+        loc = self._locate(tx, ty)
+        if loc is None:
+            return 0, 0
+        chunk, i = loc
+        return chunk.light[i] >> 4, chunk.light[i] & 15
+
+    def _scan_top(self, tx, start=0):
+        cx, lx = tx >> CHUNK_SHIFT, tx & CHUNK_MASK
+        for cy in range(start >> CHUNK_SHIFT, self.world.rows):
+            chunk = self.chunks.get((cx, cy))
+            if chunk is None:
+                break
+            column = chunk.ids[lx * CHUNK_SIZE:(lx + 1) * CHUNK_SIZE].translate(OPAQUE)
+            y0 = cy * CHUNK_SIZE
+            hit = column.find(1, max(0, start - y0))
+            if hit >= 0:
+                return min(y0 + hit, self.world.height)
+        return self.world.height
+
+    def _source(self, tx, ty, shift, chunk, i):
+        if shift == SKY:
+            return MAX_LIGHT if ty < self.tops.get(tx, 0) else 0
+        return LIGHT[chunk.ids[i]]
+
+    def light_column(self, cx):
+        """Compute light for a freshly loaded column of chunks."""
+        self.light_columns(cx, cx + 1)
+
+    def light_columns(self, cx0, cx1):
+        """Compute light from scratch for the loaded chunk columns cx0..cx1-1.
+
+        Light already in the columns on either side flows in.
+        """
+        rows = self.world.rows
+        column = [self.chunks[(cx, cy)] for cx in range(cx0, cx1) for cy in range(rows)]
+        for chunk in column:
+            chunk.light = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+            chunk.light_rev += 1
+        x0, x1 = cx0 * CHUNK_SIZE, cx1 * CHUNK_SIZE
+        for tx in range(x0, x1):
+            self.tops[tx] = self._scan_top(tx)
+
+        sky, block = deque(), deque()
+        for tx in range(x0, x1):
+            top = self.tops[tx]
+            lx = tx & CHUNK_MASK
+            # straight down from the sky at full strength
+            for cy in range(rows):
+                y0 = cy * CHUNK_SIZE
+                n = min(CHUNK_SIZE, top - y0)
+                if n <= 0:
+                    break
+                start = lx * CHUNK_SIZE
+                self.chunks[(tx >> CHUNK_SHIFT, cy)].light[start:start + n] = b'\xf0' * n
+            # only sky tiles next to a darker tile need to spread
+            edge = min(self.tops.get(tx - 1, top), self.tops.get(tx + 1, top), top - 1)
+            for ty in range(max(0, edge), top):
+                sky.append((tx, ty))
+        for chunk in column:
+            ids, light = chunk.ids, chunk.light
+            emits = ids.translate(LIGHT)
+            if emits.count(0) == len(emits):
+                continue  # no light sources in this chunk
+            for i, level in enumerate(emits):
+                if level:
+                    light[i] |= level
+                    block.append(((chunk.cx << CHUNK_SHIFT) | (i >> CHUNK_SHIFT),
+                                  (chunk.cy << CHUNK_SHIFT) | (i & CHUNK_MASK)))
+        # let light already in the neighbouring columns flow in
+        for tx in (x0 - 1, x1):
+            for ty in range(self.world.height):
+                loc = self._locate(tx, ty)
+                if loc is not None:
+                    value = loc[0].light[loc[1]]
+                    if value >> 4 > 1:
+                        sky.append((tx, ty))
+                    if value & 15 > 1:
+                        block.append((tx, ty))
+        touched = set()
+        self._spread(sky, SKY, touched)
+        self._spread(block, BLOCK, touched)
+        for chunk in touched:
+            chunk.light_rev += 1
+
+    def relight(self, columns):
+        """Recompute light after a bulk edit of the chunk columns in `columns`.
+
+        Light travels less than a chunk, so redoing the edited columns and
+        one more on each side from scratch is enough; columns beyond those
+        only feed their light in. Columns that aren't loaded are skipped.
+        """
+        rows = self.world.rows
+        todo = sorted({cx + d for cx in columns for d in (-1, 0, 1)
+                       if all((cx + d, cy) in self.chunks for cy in range(rows))})
+        start = prev = None
+        for cx in todo + [None]:
+            if start is not None and cx != prev + 1:
+                self.light_columns(start, prev + 1)
+                start = None
+            if start is None:
+                start = cx
+            prev = cx
+
+    def forget_column(self, cx):
+        for tx in range(cx * CHUNK_SIZE, (cx + 1) * CHUNK_SIZE):
+            self.tops.pop(tx, None)
+
+    def tile_changed(self, tx, ty, old_id, new_id):
+        """Relight around (tx, ty) after its tile id changed from old_id."""
+        if self._locate(tx, ty) is None:
+            return
+        touched = set()
+        old_top = self.tops.get(tx, self.world.height)
+        if OPAQUE[new_id]:
+            new_top = min(ty, old_top)
+        elif OPAQUE[old_id] and ty == old_top:
+            new_top = self._scan_top(tx, ty + 1)
+        else:
+            new_top = old_top
+        self.tops[tx] = new_top
+
+        for shift in (SKY, BLOCK):
+            darken, relight = deque(), deque()
+            # tiles that may have lost light: the edited one, plus the column
+            # below it when it now blocks the sky
+            dark_rows = range(ty, old_top) if shift == SKY and new_top < old_top else (ty,)
+            for y in dark_rows:
+                chunk, i = self._locate(tx, y)
+                level = (chunk.light[i] >> shift) & 15
+                chunk.light[i] &= ~(15 << shift) & 0xFF
+                touched.add(chunk)
+                if level:
+                    darken.append((tx, y, level))
+                source = self._source(tx, y, shift, chunk, i)
+                if source:
+                    chunk.light[i] |= source << shift
+                    relight.append((tx, y))
+            if shift == SKY:
+                # tiles the sky reaches now that the column is open
+                for y in range(old_top, new_top):
+                    chunk, i = self._locate(tx, y)
+                    chunk.light[i] |= MAX_LIGHT << SKY
+                    touched.add(chunk)
+                    relight.append((tx, y))
+            # neighbours flow back into the edited tile
+            relight.extend(((tx - 1, ty), (tx + 1, ty), (tx, ty - 1), (tx, ty + 1)))
+            self._darken(darken, relight, shift, touched)
+            self._spread(relight, shift, touched)
+        for chunk in touched:
+            chunk.light_rev += 1
+
+    def _darken(self, queue, relight, shift, touched):
+        """Zero the light that came from the tiles in `queue`.
+
+        Queue entries are (tx, ty, old level) of tiles already set to zero.
+        Brighter neighbours are lit independently and go to `relight`, as do
+        darkened tiles that are light sources themselves.
+        """
+        locate = self._locate
+        keep = ~(15 << shift) & 0xFF
+        while queue:
+            tx, ty, level = queue.popleft()
+            for nx, ny in ((tx - 1, ty), (tx + 1, ty), (tx, ty - 1), (tx, ty + 1)):
+                loc = locate(nx, ny)
+                if loc is None:
+                    continue
+                chunk, i = loc
+                nlevel = (chunk.light[i] >> shift) & 15
+                if not nlevel:
+                    continue
+                if nlevel < level:
+                    chunk.light[i] &= keep
+                    touched.add(chunk)
+                    queue.append((nx, ny, nlevel))
+                    source = self._source(nx, ny, shift, chunk, i)
+                    if source:
+                        chunk.light[i] |= source << shift
+                        relight.append((nx, ny))
+                else:
+                    relight.append((nx, ny))
+
+    def _spread(self, queue, shift, touched):
+        """Flood light outwards from the tiles in `queue`."""
+        locate = self._locate
+        keep = ~(15 << shift) & 0xFF
+        while queue:
+            tx, ty = queue.popleft()
+            loc = locate(tx, ty)
+            if loc is None:
+                continue
+            level = (loc[0].light[loc[1]] >> shift) & 15
+            if level <= 1:
+                continue
+            for nx, ny in ((tx - 1, ty), (tx + 1, ty), (tx, ty - 1), (tx, ty + 1)):
+                nloc = locate(nx, ny)
+                if nloc is None:
+                    continue
+                chunk, i = nloc
+                new = level - COST[chunk.ids[i]]
+                if new > (chunk.light[i] >> shift) & 15:
+                    chunk.light[i] = (chunk.light[i] & keep) | (new << shift)
+                    touched.add(chunk)
+                    queue.append((nx, ny))
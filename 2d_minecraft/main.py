@@ -1,40 +1,116 @@
-"""Minimal 2D side-view block game using pygame"""
+"""Minimal 2D side-view block game using pygame
+
+    python main.py                       play
+    python main.py --headless --ticks N  simulate N fixed-step ticks without a window
+"""
+import argparse
+import os
+import sys
+import time
 import pygame
 from world import World
 from player import Player
+from tiles import TileType
+from minimap import Minimap, MAX_LEVEL
 
 SCREEN_W, SCREEN_H = 800, 600
 TILE = 32
+# number keys pick the block placed with the right mouse button
+HOTBAR = {pygame.K_1: TileType.DIRT, pygame.K_2: TileType.STONE,
+          pygame.K_3: TileType.SAND, pygame.K_4: TileType.WATER}
+SAVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'saves', 'world')
+AUTOSAVE_SECONDS = 30
 
 def main():
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
     clock = pygame.time.Clock()
 
-    world = World(width=200, height=60, tile_size=TILE)
+    world = World(height=60, tile_size=TILE, save_dir=SAVE_DIR)
+    world.start_worker()
     player = Player(x=100, y=100, world=world, tile_size=TILE)
+    minimap = Minimap(world)
+    # M toggles the full screen map; the mouse wheel zooms it
+    map_level = None
 
+    autosave_t = 0.0
     running = True
     while running:
         dt = clock.tick(60) / 1000.0
+        autosave_t += dt
+        if autosave_t >= AUTOSAVE_SECONDS:
+            # only chunks edited since the last save are written, in the background
+            world.save()
+            autosave_t = 0.0
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN:
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_m:
+                map_level = 2 if map_level is None else None
+            elif event.type == pygame.MOUSEWHEEL and map_level is not None:
+                map_level = max(0, min(MAX_LEVEL, map_level - event.y))
+            elif event.type == pygame.MOUSEBUTTONDOWN and map_level is None:
                 mx, my = pygame.mouse.get_pos()
                 world.handle_mouse(event.button, mx, my, screen.get_size(), player)
+            elif event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL and event.key == pygame.K_z:
+                world.undo()
+            elif event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL and event.key == pygame.K_y:
+                world.redo()
+            elif event.type == pygame.KEYDOWN and event.key in HOTBAR:
+                player.selected = HOTBAR[event.key]
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_f:
+                # throw towards the mouse
+                mx, my = pygame.mouse.get_pos()
+                world.entities.throw(player, mx - SCREEN_W//2 + player.camera.x,
+                                     my - SCREEN_H//2 + player.camera.y)
 
         keys = pygame.key.get_pressed()
         player.handle_input(keys, dt)
         player.update(dt)
+        world.tick(dt)
+        world.entities.update(dt, player, screen.get_size())
+        world.stream(player.camera, screen.get_size())
+        # pick up chunks generated in the background, within a few ms per frame
+        world.integrate(budget=0.004)
 
-        screen.fill((135, 206, 235))  # sky color
-        world.draw(screen, camera=player.camera)
-        player.draw(screen)
+        minimap.refresh()
+        if map_level is not None:
+            center = (player.x / TILE, player.y / TILE)
+            minimap.draw(screen, screen.get_rect(), center, map_level)
+        else:
+            screen.fill((135, 206, 235))  # sky color
+            world.draw(screen, camera=player.camera)
+            world.entities.draw(screen, player.camera)
+            player.draw(screen)
+            # highlight the block under the mouse, if it is in reach
+            mx, my = pygame.mouse.get_pos()
+            world.pick(mx, my, screen.get_size(), player)
+            world.draw_highlight(screen, player.camera)
+            minimap.draw_overlay(screen, player)
 
         pygame.display.flip()
 
+    world.close()
     pygame.quit()
 
+def run_headless(ticks, seed):
+    from headless import make_simulation
+    sim = make_simulation(seed=seed, tile_size=TILE)
+    t0 = time.perf_counter()
+    sim.run(ticks)
+    elapsed = time.perf_counter() - t0
+    print(f'{ticks} ticks in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s, '
+          f'{ticks * sim.step / elapsed:.0f}x real time)')
+    print(f'player at ({sim.player.x:.1f}, {sim.player.y:.1f}), {len(sim.world.chunks)} chunks loaded')
+
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='2D side-view block game')
+    parser.add_argument('--headless', action='store_true', help='simulate without a window')
+    parser.add_argument('--ticks', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(sys.argv[1:])
+    if args.headless:
+        run_headless(args.ticks, args.seed)
+    else:
+        main()
@@ -0,0 +1,121 @@
+"""Minimap and zoomed-out map, one pixel per tile
+
+Chunk images are made straight from the tile and light arrays with a NumPy
+color lookup table and pygame.surfarray, and cached until the chunk's tiles
+or light change. They stay cached after the chunk is unloaded, so the map
+shows everything that has been explored.
+
+Zoomed-out views use a pyramid of map tiles: a level k tile is 32x32
+pixels, covers 2**k x 2**k chunks and is the 2x2 average of four level
+k - 1 tiles. Any zoom level therefore blits about the same number of
+32x32 surfaces for the same screen area, however much of the world it
+shows.
+"""
+import numpy as np
+import pygame
+from tiles import COLORS
+from chunk import CHUNK_SIZE
+
+MAX_LEVEL = 6
+UNEXPLORED = (0, 0, 0)
+# brightness for each light level; the dark is darker than in the game view
+BRIGHTNESS = np.array([0.2 + 0.8 * level / 15 for level in range(16)])
+
+_COLORS = np.array([color[:3] for color in COLORS], dtype=float)
+_COLORS[0] = (135, 206, 235)  # air shows as sky, darkened by the light below ground
+# SHADED[(tile_id << 4) | light] -> RGB
+SHADED = (_COLORS[:, None, :] * BRIGHTNESS[None, :, None]).astype(np.uint8).reshape(-1, 3)
+
+
+def chunk_pixels(chunk):
+    """(32, 32, 3) RGB array of a chunk, indexed [lx, ly] like the tile ids."""
+    ids = np.frombuffer(chunk.ids, dtype=np.uint8).astype(np.intp) << 4
+    if chunk.light is None:
+        ids |= 15
+    else:
+        light = np.frombuffer(chunk.light, dtype=np.uint8)
+        ids |= np.maximum(light >> 4, light & 15)
+    return SHADED[ids].reshape(CHUNK_SIZE, CHUNK_SIZE, 3)
+
+
+class Minimap:
+    """Cached map tiles of a world, see the module docstring."""
+    def __init__(self, world):
+        self.world = world
+        # (level, gx, gy) -> RGB array, or None if nothing under it is explored
+        self.pixels = {}
+        self.surfaces = {}
+        self.versions = {}  # (cx, cy) -> (revision, light_rev) of the level 0 image
+
+    def refresh(self):
+        """Re-make the images of loaded chunks that changed, and their ancestors."""
+        for key, chunk in self.world.chunks.items():
+            version = (chunk.revision, chunk.light_rev)
+            if self.versions.get(key) == version:
+                continue
+            self.versions[key] = version
+            cx, cy = key
+            self.pixels[(0, cx, cy)] = chunk_pixels(chunk)
+            for level in range(MAX_LEVEL + 1):
+                tile = (level, cx >> level, cy >> level)
+                if level:
+                    self.pixels.pop(tile, None)
+                self.surfaces.pop(tile, None)
+
+    def _pixels(self, level, gx, gy):
+        key = (level, gx, gy)
+        if key in self.pixels:
+            return self.pixels[key]
+        result = None
+        if level:
+            children = [self._pixels(level - 1, 2 * gx + dx, 2 * gy + dy)
+                        for dx in (0, 1) for dy in (0, 1)]
+            if any(child is not None for child in children):
+                full = np.empty((2 * CHUNK_SIZE, 2 * CHUNK_SIZE, 3), dtype=np.uint16)
+                full[...] = UNEXPLORED
+                for i, child in enumerate(children):
+                    if child is not None:
+                        x, y = (i >> 1) * CHUNK_SIZE, (i & 1) * CHUNK_SIZE
+                        full[x:x + CHUNK_SIZE, y:y + CHUNK_SIZE] = child
+                result = (full.reshape(CHUNK_SIZE, 2, CHUNK_SIZE, 2, 3).sum(axis=(1, 3)) >> 2).astype(np.uint8)
+        self.pixels[key] = result
+        return result
+
+    def tile_surface(self, level, gx, gy):
+        """32x32 surface of a map tile, or None if it is unexplored."""
+        key = (level, gx, gy)
+        surface = self.surfaces.get(key)
+        if surface is None and key not in self.surfaces:
+            pixels = self._pixels(level, gx, gy)
+            surface = None if pixels is None else pygame.surfarray.make_surface(pixels)
+            self.surfaces[key] = surface
+        return surface
+
+    def draw(self, surface, rect, center, level):
+        """Draw the map into `rect` at 2**level tiles per pixel, centered on tile `center`."""
+        rect = pygame.Rect(rect)
+        scale = 1 << level
+        # pixel of the rect where tile (0, 0) ends up
+        ox = rect.centerx - int(center[0] // scale)
+        oy = rect.centery - int(center[1] // scale)
+        clip = surface.get_clip()
+        surface.set_clip(rect)
+        surface.fill(UNEXPLORED, rect)
+        rows = -(-self.world.height // (CHUNK_SIZE * scale))
+        blits = []
+        for gx in range((rect.left - ox) // CHUNK_SIZE, (rect.right - ox) // CHUNK_SIZE + 1):
+            for gy in range(max(0, (rect.top - oy) // CHUNK_SIZE), min(rows, (rect.bottom - oy) // CHUNK_SIZE + 1)):
+                tile = self.tile_surface(level, gx, gy)
+                if tile is not None:
+                    blits.append((tile, (ox + gx * CHUNK_SIZE, oy + gy * CHUNK_SIZE)))
+        surface.blits(blits, doreturn=False)
+        surface.set_clip(clip)
+
+    def draw_overlay(self, surface, player, size=(192, 128), level=0):
+        """Small map of the area around the player in the top right corner."""
+        tw = self.world.tile_size
+        rect = pygame.Rect(surface.get_width() - size[0] - 10, 10, size[0], size[1])
+        center = (player.x / tw, (player.y - player.height / 2) / tw)
+        self.draw(surface, rect, center, level)
+        pygame.draw.rect(surface, (255, 255, 255), rect.inflate(2, 2), 1)
+        pygame.draw.rect(surface, (255, 60, 60), (rect.centerx - 1, rect.centery - 1, 3, 3))
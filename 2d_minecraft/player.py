@@ -1,5 +1,7 @@
 import pygame
 from dataclasses import dataclass
+from collision import sweep
+from tiles import TileType
 
 
 @dataclass
@@ -20,6 +22,10 @@ class Player:
         self.height = int(tile_size * 1.6)
         self.on_ground = False
         self.camera = Camera(x, y)
+        # block placed with the right mouse button
+        self.selected = TileType.DIRT
+        # picked up items, tile -> count
+        self.inventory = {}
 
     def handle_input(self, keys, dt):
         accel = 800
@@ -37,50 +43,34 @@ class Player:
     def update(self, dt):
         # gravity
         self.vy += 1000 * dt
-        nx = self.x + self.vx * dt
-        ny = self.y + self.vy * dt
+        dx = self.vx * dt
+        dy = self.vy * dt
 
-        # simple collision with world tiles (AABB vs tiles)
-        # horizontal
-        if not self._collides_at(nx, self.y):
-            self.x = nx
-        else:
-            self.vx = 0
+        # swept collision with world tiles, one axis at a time so the player
+        # slides along walls and floors; x is the center, y the feet
+        if dx:
+            t, _, _ = sweep(self.world, self.x - self.width//2, self.y - self.height,
+                            self.width, self.height, dx, 0)
+            self.x += dx * t
+            if t < 1.0:
+                self.vx = 0
 
-        # vertical
-        if not self._collides_at(self.x, ny):
-            self.y = ny
-            self.on_ground = False
-        else:
+        t, _, ny = sweep(self.world, self.x - self.width//2, self.y - self.height,
+                         self.width, self.height, 0, dy)
+        self.y += dy * t
+        if t < 1.0:
             # hit ground or ceiling
-            if self.vy > 0:
+            if ny < 0:
                 # landed
                 self.on_ground = True
             self.vy = 0
+        else:
+            self.on_ground = False
 
         # update camera to follow player
         self.camera.x = int(self.x)
         self.camera.y = int(self.y)
 
-    def _collides_at(self, px, py):
-        # check corners
-        tw = self.tile_size
-        left = int(px - self.width//2)
-        right = int(px + self.width//2 - 1)
-        top = int(py - self.height)
-        bottom = int(py - 1)
-
-        # check tiles overlapped
-        for sx in (left, right):
-            for sy in (top, bottom):
-                tx = sx // tw
-                ty = sy // tw
-                if tx < 0 or ty < 0 or tx >= self.world.width or ty >= self.world.height:
-                    continue
-                if self.world.tiles[tx][ty] != None and self.world.tiles[tx][ty].is_solid:
-                    return True
-        return False
-
     def draw(self, surface):
         cx = surface.get_width()//2
         cy = surface.get_height()//2
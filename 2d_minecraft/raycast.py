@@ -0,0 +1,83 @@
+"""Block picking with a grid traversal raycast
+
+The ray walks the tile grid from cell to cell in the order it crosses the
+cell borders (Amanatides and Woo's DDA), so it visits exactly the tiles
+under the ray and never more than about 2 * reach of them. Replaceable
+tiles (air, water) let the ray through; any other tile, solid or not
+(torches), stops it.
+"""
+import math
+from tiles import REPLACEABLE
+from chunk import CHUNK_SHIFT, CHUNK_MASK
+
+
+class RayCaster:
+    """Casts rays through a world's loaded tiles.
+
+    The result of the last cast is kept in attributes instead of being
+    returned, so casting every frame doesn't allocate:
+    `hit` and (`tx`, `ty`), the first tile that stops the ray; `can_place`
+    and (`px`, `py`), the last tile it passed through before that, or the
+    tile at its end if nothing stopped it.
+    """
+    def __init__(self, world):
+        self.world = world
+        self.hit = False
+        self.tx = self.ty = 0
+        self.can_place = False
+        self.px = self.py = 0
+
+    def _passes(self, tx, ty):
+        world = self.world
+        if ty < 0 or ty >= world.height:
+            return True
+        chunk = world.chunks.get((tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT))
+        if chunk is None:
+            return True
+        return REPLACEABLE[chunk.ids[((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)]]
+
+    def cast(self, x0, y0, x1, y1, reach):
+        """Cast from pixel (x0, y0) towards (x1, y1), at most `reach` pixels.
+
+        The ray ends at (x1, y1) if that is closer. Returns self.hit.
+        """
+        tw = self.world.tile_size
+        tx, ty = int(x0 // tw), int(y0 // tw)
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        end = min(length, reach)
+        self.hit = self.can_place = False
+        # distance along the ray to the next vertical and horizontal border,
+        # and between two borders of the same kind
+        if dx > 0:
+            step_x, t_x, delta_x = 1, ((tx + 1) * tw - x0) * length / dx, tw * length / dx
+        elif dx < 0:
+            step_x, t_x, delta_x = -1, (x0 - tx * tw) * length / -dx, tw * length / -dx
+        else:
+            step_x, t_x, delta_x = 0, math.inf, math.inf
+        if dy > 0:
+            step_y, t_y, delta_y = 1, ((ty + 1) * tw - y0) * length / dy, tw * length / dy
+        elif dy < 0:
+            step_y, t_y, delta_y = -1, (y0 - ty * tw) * length / -dy, tw * length / -dy
+        else:
+            step_y, t_y, delta_y = 0, math.inf, math.inf
+        while True:
+            if not self._passes(tx, ty):
+                self.hit = True
+                self.tx, self.ty = tx, ty
+                return True
+            self.can_place = self.world.in_bounds(tx, ty)
+            self.px, self.py = tx, ty
+            if t_x < t_y:
+                if t_x > end:
+                    break
+                tx += step_x
+                t_x += delta_x
+            else:
+                if t_y > end:
+                    break
+                ty += step_y
+                t_y += delta_y
+        # nothing in the way; placing is only possible if the ray reached the target
+        self.can_place = self.can_place and length <= reach
+        return False
@@ -0,0 +1,131 @@
+"""Region files: fixed-size, run-length encoded chunk records on disk
+
+A region file holds REGION_SIZE x REGION_SIZE chunks. Every chunk owns one
+fixed-size slot at a known offset, so a chunk can be read or rewritten in
+place without touching the rest of the file. Files are memory-mapped, so
+only the pages of chunks that are actually loaded get read from disk.
+
+Slot layout: a little-endian uint16 payload length (0 = chunk not stored)
+followed by (count, tile id) byte pairs. Chunks are stored column-major, so
+the long vertical runs of STONE and DIRT collapse to a few pairs.
+
+A store may be used from several threads (see saver.py); every access to
+the open files goes through its lock.
+"""
+from collections import OrderedDict
+import mmap
+import os
+import struct
+import threading
+import numpy as np
+from chunk import CHUNK_SIZE
+
+REGION_SHIFT = 4
+REGION_SIZE = 1 << REGION_SHIFT  # chunks per region side
+MAGIC = b'TREG'
+HEADER = struct.Struct('<4sHH')  # magic, chunk size, region size
+LENGTH = struct.Struct('<H')
+# worst case is one run per tile
+SLOT_SIZE = LENGTH.size + 2 * CHUNK_SIZE * CHUNK_SIZE
+FILE_SIZE = HEADER.size + REGION_SIZE * REGION_SIZE * SLOT_SIZE
+
+
+def rle_encode(ids):
+    a = np.frombuffer(ids, dtype=np.uint8)
+    if not len(a):
+        return bytearray()
+    starts = np.concatenate(([0], np.flatnonzero(a[1:] != a[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(a)))
+    # runs longer than 255 become several full pairs and a remainder
+    pieces = (lengths + 254) // 255
+    counts = np.full(int(pieces.sum()), 255, dtype=np.uint8)
+    counts[np.cumsum(pieces) - 1] = lengths - 255 * (pieces - 1)
+    out = np.empty(2 * len(counts), dtype=np.uint8)
+    out[0::2] = counts
+    out[1::2] = np.repeat(a[starts], pieces)
+    return bytearray(out.tobytes())
+
+
+def rle_decode(data):
+    pairs = np.frombuffer(data, dtype=np.uint8)
+    return bytearray(np.repeat(pairs[1::2], pairs[0::2]).tobytes())
+
+
+class RegionStore:
+    """Reads and writes chunk records in a directory of region files."""
+    def __init__(self, directory, max_open=8):
+        self.directory = directory
+        self.max_open = max_open
+        self.open_regions = OrderedDict()  # (rx, ry) -> (file, mmap)
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, rx, ry):
+        return os.path.join(self.directory, f'r.{rx}.{ry}.reg')
+
+    def _region(self, rx, ry, create):
+        key = (rx, ry)
+        region = self.open_regions.get(key)
+        if region is not None:
+            self.open_regions.move_to_end(key)
+            return region[1]
+        path = self._path(rx, ry)
+        if not os.path.exists(path):
+            if not create:
+                return None
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, CHUNK_SIZE, REGION_SIZE))
+                # extend to full size; unwritten slots read back as empty
+                f.truncate(FILE_SIZE)
+        f = open(path, 'r+b')
+        mm = mmap.mmap(f.fileno(), FILE_SIZE)
+        magic, chunk_size, region_size = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or chunk_size != CHUNK_SIZE or region_size != REGION_SIZE:
+            mm.close()
+            f.close()
+            raise ValueError(f'{path} is not a compatible region file')
+        if len(self.open_regions) >= self.max_open:
+            _, (old_f, old_mm) = self.open_regions.popitem(last=False)
+            old_mm.close()
+            old_f.close()
+        self.open_regions[key] = (f, mm)
+        return mm
+
+    def _offset(self, cx, cy):
+        index = (cx & (REGION_SIZE - 1)) * REGION_SIZE + (cy & (REGION_SIZE - 1))
+        return HEADER.size + index * SLOT_SIZE
+
+    def load(self, cx, cy):
+        """Tile ids of a stored chunk, or None if it was never saved."""
+        with self.lock:
+            mm = self._region(cx >> REGION_SHIFT, cy >> REGION_SHIFT, create=False)
+            if mm is None:
+                return None
+            offset = self._offset(cx, cy)
+            (length,) = LENGTH.unpack_from(mm, offset)
+            if length == 0:
+                return None
+            start = offset + LENGTH.size
+            data = mm[start:start + length]
+        return rle_decode(data)
+
+    def save(self, cx, cy, ids):
+        # encoding happens outside the lock, so readers only wait for the copy
+        data = rle_encode(ids)
+        with self.lock:
+            mm = self._region(cx >> REGION_SHIFT, cy >> REGION_SHIFT, create=True)
+            offset = self._offset(cx, cy)
+            mm[offset:offset + LENGTH.size + len(data)] = LENGTH.pack(len(data)) + data
+
+    def flush(self):
+        with self.lock:
+            for _, mm in self.open_regions.values():
+                mm.flush()
+
+    def close(self):
+        with self.lock:
+            for f, mm in self.open_regions.values():
+                mm.flush()
+                mm.close()
+                f.close()
+            self.open_regions.clear()
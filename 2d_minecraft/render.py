@@ -0,0 +1,120 @@
+"""Off-screen chunk surfaces so World.draw blits whole chunks instead of tiles
+
+A chunk is rendered with one Surface.blits call of atlas sprites, chosen by
+tile id, neighbour edge mask and the brighter of the sky and block light.
+"""
+from collections import OrderedDict
+import numpy as np
+import pygame
+from chunk import CHUNK_SIZE
+from atlas import TileAtlas, COLORKEY, UP, RIGHT, DOWN, LEFT
+
+_EMPTY = np.zeros((CHUNK_SIZE, CHUNK_SIZE), dtype=np.uint8)
+# top-left pixel offset of every tile, indexed [lx, ly]
+_LX, _LY = np.meshgrid(np.arange(CHUNK_SIZE), np.arange(CHUNK_SIZE), indexing='ij')
+
+
+def _ids(chunk):
+    if chunk is None:
+        return _EMPTY
+    return np.frombuffer(chunk.ids, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+
+
+class ChunkRenderer:
+    """Bounded LRU cache of pre-rendered chunk surfaces.
+
+    Each entry remembers the revisions it was drawn from (the chunk's tiles
+    and light, and its four neighbours' tiles for the edge masks), so a chunk
+    is only re-rendered after one of them changed.
+    """
+    def __init__(self, tile_size, chunks, max_chunks=64):
+        self.tile_size = tile_size
+        self.chunks = chunks
+        self.max_chunks = max_chunks
+        self.atlas = TileAtlas(tile_size)
+        # surface World.draw last drew to, see prerender
+        self.target = None
+        self.cache = OrderedDict()  # (cx, cy) -> [version, surface]
+
+    def _neighbours(self, cx, cy):
+        get = self.chunks.get
+        return get((cx, cy - 1)), get((cx + 1, cy)), get((cx, cy + 1)), get((cx - 1, cy))
+
+    def get(self, chunk):
+        key = (chunk.cx, chunk.cy)
+        version = (chunk.revision, chunk.light_rev) + tuple(
+            -1 if n is None else n.revision for n in self._neighbours(chunk.cx, chunk.cy))
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+            if entry[0] != version:
+                self._render(chunk, entry[1])
+                entry[0] = version
+            return entry[1]
+
+        surface = None
+        if len(self.cache) >= self.max_chunks:
+            # recycle the least recently used surface instead of allocating
+            _, (_, surface) = self.cache.popitem(last=False)
+        if surface is None:
+            size = CHUNK_SIZE * self.tile_size
+            surface = pygame.Surface((size, size))
+            surface.set_colorkey(COLORKEY, pygame.RLEACCEL)
+        self._render(chunk, surface)
+        self.cache[key] = [version, surface]
+        return surface
+
+    def prerender(self, chunk):
+        """Render a chunk ahead of time, outside of World.draw.
+
+        SDL RLE-encodes a surface on its first blit to a given destination,
+        which costs about as much as rendering it, so a one-pixel blit to the
+        last draw target gets that done now as well. The encoding is kept per
+        destination surface, so a scratch surface wouldn't do; the pixel the
+        blit covers is put back instead.
+        """
+        surface = self.get(chunk)
+        target = self.target
+        if target is not None:
+            pixel = target.get_at((0, 0))
+            target.blit(surface, (0, 0), (0, 0, 1, 1))
+            target.set_at((0, 0), pixel)
+
+    def invalidate(self, cx, cy):
+        self.cache.pop((cx, cy), None)
+
+    def clear(self):
+        self.cache.clear()
+
+    def edge_masks(self, chunk):
+        """UP/RIGHT/DOWN/LEFT bits set where the neighbour holds the same tile."""
+        ids = _ids(chunk)
+        up, right, down, left = (_ids(n) for n in self._neighbours(chunk.cx, chunk.cy))
+        padded = np.zeros((CHUNK_SIZE + 2, CHUNK_SIZE + 2), dtype=np.uint8)
+        padded[1:-1, 1:-1] = ids
+        padded[1:-1, 0] = up[:, -1]
+        padded[1:-1, -1] = down[:, 0]
+        padded[0, 1:-1] = left[-1, :]
+        padded[-1, 1:-1] = right[0, :]
+        return ((padded[1:-1, :-2] == ids) * UP | (padded[2:, 1:-1] == ids) * RIGHT
+                | (padded[1:-1, 2:] == ids) * DOWN | (padded[:-2, 1:-1] == ids) * LEFT)
+
+    def _render(self, chunk, surface):
+        tw = self.tile_size
+        ids = _ids(chunk).astype(np.int32)
+        if chunk.light is not None:
+            light = np.frombuffer(chunk.light, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+            level = np.maximum(light >> 4, light & 15)
+        else:
+            level = _EMPTY
+        keys = (ids << 8) | (self.edge_masks(chunk) << 4) | level
+        solid = ids != 0
+        sprite = self.atlas.sprite
+        # drawing into an RLE-accelerated surface decodes it on every blit, so
+        # drop the colorkey while rendering and re-encode once at the end
+        surface.set_colorkey(None)
+        surface.fill(COLORKEY)
+        surface.blits([(sprite(key), (x, y)) for key, x, y in zip(
+            keys[solid].tolist(), (_LX[solid] * tw).tolist(), (_LY[solid] * tw).tolist())],
+            doreturn=False)
+        surface.set_colorkey(COLORKEY, pygame.RLEACCEL)
@@ -0,0 +1,112 @@
+"""Autosave on a background thread with copy-on-write chunk snapshots
+
+Taking a snapshot doesn't copy any tiles: the snapshot just keeps a
+reference to every dirty chunk and marks it as shared. The saver thread
+then copies and writes the shared chunks one at a time while the game goes
+on. A chunk that is about to be edited while still shared hands its
+current ids to the snapshot first (Chunk.unshare), so the save always sees
+the tiles as they were when the snapshot was taken, and only chunks edited
+in the meantime are ever copied on the main thread.
+
+The pause for a snapshot is one pass over the loaded chunks; the world
+size and the number of chunks on disk don't matter. Between two chunks the
+saver thread sleeps for an instant, which hands the GIL back to the main
+loop right away instead of after the interpreter's switch interval.
+
+Chunks waiting to be written are looked up here before the region files,
+so a column unloaded and reloaded before its save lands still comes back
+with its edits.
+"""
+import threading
+import time
+
+
+class Saver:
+    """Writes chunks to a RegionStore on a daemon thread."""
+    def __init__(self, store):
+        self.store = store
+        # (cx, cy) -> shared Chunk or bytes waiting to be written, oldest first
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.written = 0
+        self._stopping = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def snapshot(self, chunks):
+        """Queue the dirty chunks among `chunks` without copying them.
+
+        Returns how many were queued.
+        """
+        queued = 0
+        with self.lock:
+            for chunk in chunks:
+                if chunk.dirty:
+                    chunk.dirty = False
+                    chunk.shared = self
+                    self.pending[(chunk.cx, chunk.cy)] = chunk
+                    queued += 1
+            if queued:
+                self.changed.notify_all()
+        return queued
+
+    def put(self, cx, cy, ids):
+        """Queue a copy of `ids` as the tiles of chunk (cx, cy)."""
+        with self.lock:
+            self.pending[(cx, cy)] = bytes(ids)
+            self.changed.notify_all()
+
+    def unshare(self, chunk):
+        """Give the snapshot its own copy of a shared chunk before it is edited."""
+        with self.lock:
+            key = (chunk.cx, chunk.cy)
+            if self.pending.get(key) is chunk:
+                self.pending[key] = bytes(chunk.ids)
+            chunk.shared = None
+
+    def load(self, cx, cy):
+        """Tile ids of chunk (cx, cy) as last saved, or None if it never was."""
+        with self.lock:
+            item = self.pending.get((cx, cy))
+            if item is not None:
+                return bytearray(item if isinstance(item, bytes) else item.ids)
+        return self.store.load(cx, cy)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self._stopping:
+                    self.changed.wait()
+                if not self.pending:
+                    return
+                key = next(iter(self.pending))
+                item = self.pending[key]
+                if not isinstance(item, bytes):
+                    # not edited since the snapshot: copy it now, and from
+                    # here on the live chunk has its ids to itself again
+                    item.shared = None
+                    item = self.pending[key] = bytes(item.ids)
+            self.store.save(key[0], key[1], item)
+            with self.lock:
+                # a newer version queued meanwhile stays for the next round
+                if self.pending.get(key) is item:
+                    del self.pending[key]
+                self.written += 1
+                if not self.pending:
+                    self.changed.notify_all()
+            time.sleep(0)
+
+    def wait(self):
+        """Block until everything queued is on disk."""
+        with self.lock:
+            while self.pending:
+                self.changed.wait()
+        self.store.flush()
+
+    def stop(self):
+        with self.lock:
+            self._stopping = True
+            self.changed.notify_all()
+        self.thread.join()
+        self.store.flush()
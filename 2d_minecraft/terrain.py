@@ -0,0 +1,240 @@
+"""Deterministic terrain generation from a world seed
+
+Every column's surface height is a pure function of (seed, x), built from a
+few octaves of hashed value noise, so any chunk can be generated on its own
+and regenerated identically after it has been unloaded.
+
+The scalar functions (mix64, lattice, surface_height) and their NumPy
+counterparts compute bit-identical results; chunks and large regions are
+generated with NumPy, and generate_parallel spreads a wide region over a
+process pool.
+
+Below the surface, a second stage carves caves with a smoothing cellular
+automaton and scatters ore veins at Poisson-disk spaced sites. Both depend
+only on per-tile hashes within a fixed distance (CAVE_STEPS and
+ORE_RADIUS + 1), so a block padded by that much comes out exactly as it
+would as part of any larger region and chunks still line up seamlessly.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tiles import TILE_IDS, TileType
+from chunk import Chunk, CHUNK_SIZE
+
+MASK64 = (1 << 64) - 1
+
+# (period in tiles, amplitude in tiles) of each noise octave
+OCTAVES = ((48, 10.0), (16, 4.0), (6, 1.5))
+
+GRASS = TILE_IDS[TileType.GRASS]
+DIRT = TILE_IDS[TileType.DIRT]
+STONE = TILE_IDS[TileType.STONE]
+COAL = TILE_IDS[TileType.COAL]
+IRON = TILE_IDS[TileType.IRON]
+
+# hash salts of the 2D noise fields (the octaves use 0..len(OCTAVES)-1)
+CAVE_SALT, ORE_SALT, ORE_TYPE_SALT, VEIN_SALT = 16, 17, 18, 19
+
+CAVE_OPEN = 0.42   # share of tiles that start out open
+CAVE_STEPS = 4     # smoothing passes; each reads one tile further out
+CAVE_DEPTH = 6     # rows under the surface that are never carved
+ORE_DENSITY = 0.02  # share of tiles that are candidate ore sites
+ORE_RADIUS = 4     # minimum distance between two ore sites
+VEIN_FILL = 0.5    # chance of each tile around a site joining the vein
+IRON_DEPTH = 12    # rows below the average ground level where iron starts
+IRON_SHARE = 0.4   # share of the sites that deep down are iron
+STRIP = 2048       # columns per pass of the cave and ore stage
+
+# offsets of the other tiles within ORE_RADIUS, and of a vein (site first)
+DISK_X, DISK_Y = np.array([(dx, dy) for dx in range(-ORE_RADIUS, ORE_RADIUS + 1)
+                           for dy in range(-ORE_RADIUS, ORE_RADIUS + 1)
+                           if (dx or dy) and dx * dx + dy * dy <= ORE_RADIUS ** 2]).T
+VEIN_X, VEIN_Y = np.array(sorted(((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)),
+                                 key=lambda d: d != (0, 0))).T
+
+
+def mix64(z):
+    """splitmix64 finalizer: scrambles a 64-bit integer."""
+    z = (z + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def hash_coord(seed, salt, x):
+    """64-bit hash of an integer coordinate (negative x is fine)."""
+    return mix64(mix64((seed + salt) & MASK64) ^ (x & MASK64))
+
+
+def lattice(seed, salt, x):
+    """Pseudo-random float in [0, 1) attached to integer lattice point x."""
+    return (hash_coord(seed, salt, x) >> 11) * (1.0 / (1 << 53))
+
+
+def mix64_array(z):
+    """mix64 over a uint64 array (wrap-around multiplication is intended)."""
+    z = z + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def lattice_array(seed, salt, xs):
+    """lattice() for an int64 array of lattice points."""
+    key = np.uint64(mix64((seed + salt) & MASK64))
+    h = mix64_array(key ^ xs.astype(np.uint64))
+    return (h >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def noise2d_array(seed, salt, xs, ys):
+    """Pseudo-random floats in [0, 1) for broadcastable int64 arrays of x and y."""
+    key = np.uint64(mix64((seed + salt) & MASK64))
+    h = mix64_array(mix64_array(key ^ xs.astype(np.uint64)) ^ ys.astype(np.uint64))
+    return (h >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def _box_sum(grid):
+    """Sums over each 3x3 neighbourhood; the result is one smaller on every side."""
+    rows = grid[:-2] + grid[1:-1] + grid[2:]
+    return rows[:, :-2] + rows[:, 1:-1] + rows[:, 2:]
+
+
+def cave_mask(seed, x0, y0, width, rows):
+    """(width, rows) bool array, True where the cave automaton leaves open space."""
+    pad = CAVE_STEPS
+    xs = np.arange(x0 - pad, x0 + width + pad, dtype=np.int64)[:, None]
+    ys = np.arange(y0 - pad, y0 + rows + pad, dtype=np.int64)[None, :]
+    wall = (noise2d_array(seed, CAVE_SALT, xs, ys) >= CAVE_OPEN).astype(np.uint8)
+    # 4-5 rule: a tile is wall if at least 5 of the 9 tiles around it are
+    for _ in range(CAVE_STEPS):
+        wall = (_box_sum(wall) >= 5).astype(np.uint8)
+    return wall == 0
+
+
+def ore_tiles(seed, ground, x0, y0, width, rows):
+    """(width, rows) uint8 array of ore tile ids, 0 where there is no ore.
+
+    Candidate sites are the tiles whose hash is below ORE_DENSITY, and a
+    candidate becomes a site unless another candidate within ORE_RADIUS has
+    a lower hash. No two sites are closer than ORE_RADIUS, and the choice
+    only looks at hashes, so it doesn't depend on the block boundaries.
+    Each site grows into a vein over its 3x3 neighbourhood.
+    """
+    r = ORE_RADIUS
+    pad = r + 1
+    xs = np.arange(x0 - pad, x0 + width + pad, dtype=np.int64)
+    ys = np.arange(y0 - pad, y0 + rows + pad, dtype=np.int64)
+    u = noise2d_array(seed, ORE_SALT, xs[:, None], ys[None, :])
+    # candidates in the block plus one tile around it (veins reach one tile)
+    sx, sy = np.nonzero(u[r:-r, r:-r] < ORE_DENSITY)
+    sx += r
+    sy += r
+    keep = (u[sx[:, None] + DISK_X, sy[:, None] + DISK_Y] >= u[sx, sy][:, None]).all(axis=1)
+    sx, sy = sx[keep], sy[keep]
+    deep = ys[sy] >= ground + IRON_DEPTH
+    iron = deep & (noise2d_array(seed, ORE_TYPE_SALT, xs[sx], ys[sy]) < IRON_SHARE)
+    kind = np.where(iron, IRON, COAL).astype(np.uint8)
+    # every site keeps its own tile, its eight neighbours join at random
+    vx = sx[:, None] + VEIN_X
+    vy = sy[:, None] + VEIN_Y
+    grow = noise2d_array(seed, VEIN_SALT, xs[vx], ys[vy]) < VEIN_FILL
+    grow[:, 0] = True
+    ore = np.zeros((width + 2 * pad, rows + 2 * pad), dtype=np.uint8)
+    ore[vx[grow], vy[grow]] = np.broadcast_to(kind[:, None], grow.shape)[grow]
+    return ore[pad:-pad, pad:-pad]
+
+
+class TerrainGenerator:
+    """Generates chunks for a world of fixed height and unbounded width."""
+    def __init__(self, seed, height):
+        self.seed = seed
+        self.height = height
+        self.ground = height // 3
+        self.amplitude = sum(amp for _, amp in OCTAVES)
+        self._last_heights = (None, None)
+
+    def surface_height(self, x):
+        """Row of the grass tile in column x."""
+        n = 0.0
+        for salt, (period, amp) in enumerate(OCTAVES):
+            i = x // period
+            f = (x - i * period) / period
+            a = lattice(self.seed, salt, i)
+            b = lattice(self.seed, salt, i + 1)
+            s = f * f * (3.0 - 2.0 * f)
+            n += (a + (b - a) * s) * amp
+        h = self.ground + math.floor(n - self.amplitude / 2)
+        return max(3, min(self.height - 1, h))
+
+    def surface_heights(self, x0, count):
+        """surface_height for columns x0..x0+count-1 as an int64 array."""
+        xs = np.arange(x0, x0 + count, dtype=np.int64)
+        n = np.zeros(count)
+        for salt, (period, amp) in enumerate(OCTAVES):
+            i = xs // period
+            f = (xs - i * period) / period
+            a = lattice_array(self.seed, salt, i)
+            b = lattice_array(self.seed, salt, i + 1)
+            s = f * f * (3.0 - 2.0 * f)
+            n += (a + (b - a) * s) * amp
+        h = self.ground + np.floor(n - self.amplitude / 2).astype(np.int64)
+        return np.clip(h, 3, self.height - 1)
+
+    def generate_region(self, x0, width, y0=0, rows=None):
+        """Tile ids of a (width, rows) block of columns starting at (x0, y0).
+
+        Rows default to the full world height; rows below the world floor
+        come back as AIR.
+        """
+        if rows is None:
+            rows = self.height - y0
+        cached_x0, h = self._last_heights
+        if x0 != cached_x0 or width != CHUNK_SIZE:
+            h = self.surface_heights(x0, width)[:, None]
+            if width == CHUNK_SIZE:
+                # chunks of one column are usually generated back to back
+                self._last_heights = (x0, h)
+        ys = np.arange(y0, y0 + rows)[None, :]
+        tiles = np.where(ys < h + 4, DIRT, STONE).astype(np.uint8)
+        tiles[ys == h] = GRASS
+        tiles[(ys < h) | (ys >= self.height)] = 0
+        self._caves_and_ores(tiles, h, x0, y0, width, rows)
+        return tiles
+
+    def _caves_and_ores(self, tiles, h, x0, y0, width, rows):
+        ys = np.arange(y0, y0 + rows)[None, :]
+        deep = (ys >= h + CAVE_DEPTH) & (ys < self.height - 1)
+        # wide regions go in strips to bound the size of the noise arrays
+        for s in range(0, width, STRIP):
+            part, below = tiles[s:s + STRIP], deep[s:s + STRIP]
+            if not below.any():
+                continue
+            w = len(part)
+            ore = ore_tiles(self.seed, self.ground, x0 + s, y0, w, rows)
+            ore[part != STONE] = 0
+            np.copyto(part, ore, where=ore != 0)
+            part[below & cave_mask(self.seed, x0 + s, y0, w, rows)] = 0
+
+    def generate_chunk(self, cx, cy):
+        ids = self.generate_region(cx * CHUNK_SIZE, CHUNK_SIZE, cy * CHUNK_SIZE, CHUNK_SIZE)
+        # C order of a (lx, ly) array is the chunk's column-major layout
+        return Chunk(cx, cy, bytearray(ids.tobytes()))
+
+    def generate_column(self, cx, rows):
+        """The chunks of column cx from the top down, generated as one region."""
+        ids = self.generate_region(cx * CHUNK_SIZE, CHUNK_SIZE, 0, rows * CHUNK_SIZE)
+        return [Chunk(cx, cy, bytearray(ids[:, cy * CHUNK_SIZE:(cy + 1) * CHUNK_SIZE].tobytes()))
+                for cy in range(rows)]
+
+
+def _generate_region_job(job):
+    seed, height, x0, width = job
+    return TerrainGenerator(seed, height).generate_region(x0, width)
+
+
+def generate_parallel(seed, height, x0, width, workers=None, region_width=8192):
+    """generate_region for a wide area, one region per process pool task."""
+    jobs = [(seed, height, x, min(region_width, x0 + width - x))
+            for x in range(x0, x0 + width, region_width)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(_generate_region_job, jobs)))
@@ -1,12 +1,79 @@
+"""Tile types, declared in tiles.json
+
+A tile's id is its position in tiles.json. Chunks and saves store these
+ids, so AIR must stay first (empty chunks are all zeros) and new tiles go
+at the end. Each entry has a "name" and a "color" and may override any of
+the other properties in DEFAULTS:
+
+    solid        entities collide with it
+    opaque       it blocks skylight and dims light like a wall (default: solid)
+    light        block light it emits, 0-15
+    hardness     how long it takes to break; negative means it can't be
+    replaceable  placing a block may overwrite it, and picking rays pass through
+    style        sprite painter in atlas.py, "block" unless it has a custom one
+
+Besides the TileType enum, every property is kept in a flat table indexed
+by tile id with an entry for all 256 possible ids, so hot loops turn the
+byte from a chunk into a property with a single index, and the byte
+tables double as bytes.translate tables.
+"""
 from enum import Enum
+import json
+import os
 
+TILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tiles.json')
+DEFAULTS = {'solid': True, 'opaque': None, 'light': 0, 'hardness': 1.0,
+            'replaceable': False, 'style': 'block'}
 
-class TileType(Enum):
-    AIR = (False, (0,0,0,0))
-    GRASS = (True, (86, 125, 70))
-    DIRT = (True, (155, 118, 83))
-    STONE = (True, (120, 120, 120))
 
-    def __init__(self, is_solid, color):
+class Tile(Enum):
+    """Base of TileType; members are made from the entries of tiles.json."""
+    def __init__(self, tile_id, is_solid, opaque, color, light, hardness, replaceable, style):
+        self.id = tile_id
         self.is_solid = is_solid
+        self.opaque = opaque
         self.color = color
+        # block light emitted by the tile (0-15)
+        self.light = light
+        self.hardness = hardness
+        self.replaceable = replaceable
+        self.style = style
+
+
+def load_tiles(path=TILES_PATH):
+    """The TileType enum declared in a tiles.json file."""
+    with open(path) as f:
+        entries = json.load(f)
+    if not entries or entries[0]['name'] != 'AIR':
+        raise ValueError(f'{path}: the first tile must be AIR')
+    if len(entries) > 256:
+        raise ValueError(f'{path}: at most 256 tiles fit in a chunk byte')
+    members = []
+    for i, entry in enumerate(entries):
+        unknown = set(entry) - set(DEFAULTS) - {'name', 'color'}
+        if unknown:
+            raise ValueError(f'{path}: unknown properties {sorted(unknown)} on {entry["name"]}')
+        props = {**DEFAULTS, **entry}
+        opaque = props['solid'] if props['opaque'] is None else props['opaque']
+        members.append((props['name'], (i, props['solid'], opaque, tuple(props['color']),
+                                        props['light'], props['hardness'], props['replaceable'],
+                                        props['style'])))
+    return Tile('TileType', members, module=__name__)
+
+
+TileType = load_tiles()
+TILES = list(TileType)
+TILE_IDS = {tile: tile.id for tile in TILES}
+
+
+def _table(value, default=0):
+    return [value(tile) for tile in TILES] + [default] * (256 - len(TILES))
+
+
+# per tile id property tables
+SOLID = bytes(_table(lambda tile: tile.is_solid))
+OPAQUE = bytes(_table(lambda tile: tile.opaque))
+LIGHT = bytes(_table(lambda tile: tile.light))
+REPLACEABLE = bytes(_table(lambda tile: tile.replaceable))
+HARDNESS = tuple(_table(lambda tile: tile.hardness, -1))
+COLORS = tuple(_table(lambda tile: tile.color, (0, 0, 0, 0)))
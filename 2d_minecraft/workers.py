@@ -0,0 +1,49 @@
+"""Background threads that generate chunk columns ahead of the camera
+
+Terrain generation is mostly NumPy work, which releases the GIL, so it
+overlaps well with the main loop. Finished columns are handed back through
+a queue; the main thread integrates them (lighting, render cache) itself,
+under a per-frame time budget, because both touch neighbouring chunks.
+"""
+import queue
+import threading
+
+
+class ChunkWorker:
+    """Runs make_column(cx) on a pool of daemon threads."""
+    def __init__(self, make_column, threads=2):
+        self.make_column = make_column
+        self.jobs = queue.Queue()
+        self.done = queue.Queue()
+        # columns requested and not yet collected; only touched by the main thread
+        self.pending = set()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            cx = self.jobs.get()
+            if cx is None:
+                return
+            self.done.put((cx, self.make_column(cx)))
+
+    def request(self, cx):
+        if cx not in self.pending:
+            self.pending.add(cx)
+            self.jobs.put(cx)
+
+    def take(self):
+        """(cx, chunks) of one finished column, or None if nothing is ready."""
+        try:
+            cx, chunks = self.done.get_nowait()
+        except queue.Empty:
+            return None
+        self.pending.discard(cx)
+        return cx, chunks
+
+    def stop(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -1,52 +1,345 @@
+from collections import deque
+import json
+import os
 import random
+import time
+import numpy as np
 import pygame
-from tiles import TileType
+from tiles import TileType, TILES, TILE_IDS, REPLACEABLE, HARDNESS
+from chunk import Chunk, CHUNK_SHIFT, CHUNK_SIZE, CHUNK_MASK
+from render import ChunkRenderer
+from terrain import TerrainGenerator, generate_parallel
+from region import RegionStore
+from saver import Saver
+from lighting import Lighting
+from workers import ChunkWorker
+from cellular import CellularAutomaton
+from entities import EntityManager
+from raycast import RayCaster
+from edits import EditBatch, EditHistory
+
+# seconds between steps of the falling sand and water simulation
+CELL_STEP = 1 / 20
+# how far from the player blocks can be broken and placed, in tiles
+REACH = 6
 
 class World:
-    def __init__(self, width=200, height=60, tile_size=32):
+    """Tile world made of chunks that are generated on demand.
+
+    The world is `height` tiles tall and, unless `width` is given, unbounded
+    horizontally. Chunks are created from the seed the first time they are
+    needed, and `stream` unloads chunk columns far away from the camera.
+
+    With a `save_dir`, edited chunks are written to region files there and
+    read back instead of being regenerated. The seed and size are stored
+    alongside, so reopening a save ignores the arguments given here.
+    """
+    def __init__(self, width=None, height=60, tile_size=32, seed=None, load_margin=2,
+                 save_dir=None):
+        self.store = None
+        self.saver = None
+        if save_dir is not None:
+            meta_path = os.path.join(save_dir, 'world.json')
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                width, height, seed = meta['width'], meta['height'], meta['seed']
+            self.store = RegionStore(save_dir)
+            self.saver = Saver(self.store)
         self.width = width
         self.height = height
         self.tile_size = tile_size
-        self.tiles = [[TileType.AIR for _ in range(height)] for _ in range(width)]
-        self.generate_heightmap()
-
-    def generate_heightmap(self):
-        ground_height = self.height // 3
-        noise = [0] * self.width
-        for x in range(self.width):
-            if x == 0:
-                noise[x] = ground_height
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        if save_dir is not None and not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump({'width': width, 'height': height, 'seed': self.seed}, f)
+        # chunk columns kept loaded beyond the visible ones on each side
+        self.load_margin = load_margin
+        self.rows = (height + CHUNK_MASK) // CHUNK_SIZE
+        self.generator = TerrainGenerator(self.seed, height)
+        # chunks keyed by (cx, cy); each holds CHUNK_SIZE x CHUNK_SIZE tile ids
+        self.chunks = {}
+        self.lighting = Lighting(self)
+        self.cellular = CellularAutomaton(self)
+        # chunk columns edited with set_tile(relight=False) since the last relight()
+        self.unlit = set()
+        self._cell_time = 0.0
+        self.entities = EntityManager(self)
+        self.ray = RayCaster(self)
+        self.history = EditHistory()
+        self.renderer = ChunkRenderer(tile_size, self.chunks)
+        # optional background generation, see start_worker
+        self.worker = None
+        self.prefetch = 3
+        self._prerender = deque()
+        self._wanted = None
+        self._near = None
+        self._last_camera_x = None
+
+    def in_bounds(self, tx, ty):
+        if ty < 0 or ty >= self.height:
+            return False
+        return self.width is None or 0 <= tx < self.width
+
+    def get_chunk(self, cx, cy):
+        chunk = self.chunks.get((cx, cy))
+        if chunk is None:
+            chunk = self._load_chunk(cx, cy)
+        return chunk
+
+    def tile_id(self, tx, ty):
+        """Id of the tile at (tx, ty), for indexing the tables in tiles.py; AIR outside."""
+        if not self.in_bounds(tx, ty):
+            return 0
+        chunk = self.chunks.get((tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT))
+        if chunk is None:
+            chunk = self._load_chunk(tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT)
+        return chunk.ids[((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)]
+
+    def get_tile(self, tx, ty):
+        return TILES[self.tile_id(tx, ty)]
+
+    def set_tile(self, tx, ty, tile, wake=True, relight=True):
+        """Change a tile; unless `wake` is False, nearby sand and water start moving.
+
+        With `relight` False the light is left as it was until relight() is
+        called, which redoes every column edited that way at once; use it
+        for many edits in a row.
+        """
+        if not self.in_bounds(tx, ty):
+            return
+        chunk = self.get_chunk(tx >> CHUNK_SHIFT, ty >> CHUNK_SHIFT)
+        i = ((tx & CHUNK_MASK) << CHUNK_SHIFT) | (ty & CHUNK_MASK)
+        tile_id = TILE_IDS[tile]
+        old_id = chunk.ids[i]
+        if old_id != tile_id:
+            chunk.unshare()
+            chunk.ids[i] = tile_id
+            chunk.revision += 1
+            chunk.dirty = True
+            if relight:
+                self.lighting.tile_changed(tx, ty, old_id, tile_id)
             else:
-                noise[x] = max(3, noise[x-1] + random.randint(-1, 2))
-
-        for x in range(self.width):
-            h = min(self.height-1, noise[x] + random.randint(0, 3))
-            for y in range(self.height):
-                if y >= h:
-                    # top layers different types
-                    if y == h:
-                        self.tiles[x][y] = TileType.GRASS
-                    elif y < h + 4:
-                        self.tiles[x][y] = TileType.DIRT
-                    else:
-                        self.tiles[x][y] = TileType.STONE
+                self.unlit.add(tx >> CHUNK_SHIFT)
+            if wake:
+                self.cellular.wake(tx, ty)
+
+    def relight(self):
+        """Bring the light of the columns edited with set_tile(relight=False) up to date."""
+        if self.unlit:
+            self.lighting.relight(self.unlit)
+            self.unlit.clear()
+
+    def edit(self):
+        """Start a batch of edits, used as `with world.edit() as batch:`.
+
+        See edits.py; the batch is one step of undo and redo.
+        """
+        return EditBatch(self)
+
+    def undo(self):
+        return self.history.undo(self)
+
+    def redo(self):
+        return self.history.redo(self)
+
+    def copy_region(self, x0, y0, x1, y1):
+        """Tile ids of columns x0..x1-1 and rows y0..y1-1 as a (width, rows) array."""
+        out = np.zeros((x1 - x0, y1 - y0), dtype=np.uint8)
+        for cx in range(x0 >> CHUNK_SHIFT, ((x1 - 1) >> CHUNK_SHIFT) + 1):
+            for cy in range(max(0, y0) >> CHUNK_SHIFT, ((min(self.rows * CHUNK_SIZE, y1) - 1) >> CHUNK_SHIFT) + 1):
+                ax, bx = max(x0, cx << CHUNK_SHIFT), min(x1, (cx + 1) << CHUNK_SHIFT)
+                ay, by = max(y0, cy << CHUNK_SHIFT), min(y1, (cy + 1) << CHUNK_SHIFT)
+                ids = np.frombuffer(self.get_chunk(cx, cy).ids, dtype=np.uint8).reshape(CHUNK_SIZE, CHUNK_SIZE)
+                out[ax - x0:bx - x0, ay - y0:by - y0] = ids[ax - (cx << CHUNK_SHIFT):bx - (cx << CHUNK_SHIFT),
+                                                             ay - (cy << CHUNK_SHIFT):by - (cy << CHUNK_SHIFT)]
+        return out
+
+    def _load_chunk(self, cx, cy):
+        # whole columns are loaded at once so skylight can be computed
+        self._load_column(cx)
+        return self.chunks[(cx, cy)]
+
+    def _generate_column(self, cx):
+        """Freshly generated chunks of column cx (safe to call from any thread)."""
+        chunks = self.generator.generate_column(cx, self.rows)
+        if self.width is not None and (cx + 1) * CHUNK_SIZE > self.width:
+            # blank out the columns past the right edge of a bounded world
+            start = max(0, self.width - cx * CHUNK_SIZE) * CHUNK_SIZE
+            for chunk in chunks:
+                chunk.ids[start:] = bytes(len(chunk.ids) - start)
+        return chunks
+
+    def _load_column(self, cx, generated=None):
+        missing = [cy for cy in range(self.rows) if (cx, cy) not in self.chunks]
+        if not missing:
+            return
+        for cy in missing:
+            # saved chunks take precedence over generated ones
+            ids = self.saver.load(cx, cy) if self.saver is not None else None
+            if ids is not None:
+                self.chunks[(cx, cy)] = Chunk(cx, cy, ids)
+                continue
+            if generated is None:
+                generated = self._generate_column(cx)
+            self.chunks[(cx, cy)] = generated[cy]
+        self.lighting.light_column(cx)
+
+    def load_columns(self, cx0, cx1):
+        """Make sure every chunk in columns cx0..cx1-1 is loaded."""
+        for cx in range(cx0, cx1):
+            for cy in range(self.rows):
+                if (cx, cy) not in self.chunks:
+                    self._load_column(cx)
+                    break
+
+    def pregenerate(self, cx0, cx1, workers=None):
+        """Generate columns cx0..cx1-1 up front, spread over a process pool."""
+        tiles = generate_parallel(self.seed, self.height, cx0 * CHUNK_SIZE,
+                                  (cx1 - cx0) * CHUNK_SIZE, workers=workers)
+        if self.width is not None:
+            tiles[max(0, self.width - cx0 * CHUNK_SIZE):] = 0
+        pad = self.rows * CHUNK_SIZE - self.height
+        tiles = np.pad(tiles, ((0, 0), (0, pad)))
+        for cx in range(cx0, cx1):
+            x = (cx - cx0) * CHUNK_SIZE
+            missing = [cy for cy in range(self.rows) if (cx, cy) not in self.chunks]
+            for cy in missing:
+                y = cy * CHUNK_SIZE
+                ids = self.saver.load(cx, cy) if self.saver is not None else None
+                if ids is None:
+                    ids = bytearray(tiles[x:x + CHUNK_SIZE, y:y + CHUNK_SIZE].tobytes())
+                self.chunks[(cx, cy)] = Chunk(cx, cy, ids)
+            if missing:
+                self.lighting.light_column(cx)
+
+    def unload_column(self, cx):
+        for cy in range(self.rows):
+            chunk = self.chunks.get((cx, cy))
+            if chunk is None:
+                continue
+            if chunk.dirty:
+                if self.saver is None:
+                    # nowhere to write the edits, so keep the chunk resident
+                    continue
+                self.saver.put(cx, cy, chunk.ids)
+            del self.chunks[(cx, cy)]
+            self.renderer.invalidate(cx, cy)
+        if not any((cx, cy) in self.chunks for cy in range(self.rows)):
+            self.lighting.forget_column(cx)
+            # moving tiles in a saved column freeze until it is edited again
+            self.cellular.forget_column(cx)
+
+    def save(self, wait=False):
+        """Save every chunk edited since the last save to the region files.
+
+        The chunks are written on a background thread from a copy-on-write
+        snapshot (see saver.py), so this returns at once unless `wait` is
+        set. Returns how many chunks were queued.
+        """
+        if self.saver is None:
+            return 0
+        saved = self.saver.snapshot(self.chunks.values())
+        if wait:
+            self.saver.wait()
+        return saved
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+        if self.saver is not None:
+            self.saver.snapshot(self.chunks.values())
+            self.saver.stop()
+            self.saver = None
+            self.store.close()
+
+    def start_worker(self, threads=2):
+        """Generate columns near the camera on background threads.
+
+        Once started, `stream` only loads visible columns synchronously and
+        queues the rest; call `integrate` every frame to pick them up.
+        """
+        self.worker = ChunkWorker(self._generate_column, threads)
+
+    def stream(self, camera, screen_size):
+        """Load the chunk columns around the camera and unload distant ones."""
+        span = CHUNK_SIZE * self.tile_size
+        left = int(camera.x) - screen_size[0]//2
+        visible = range(left // span, (left + screen_size[0]) // span + 1)
+        first = visible.start - self.load_margin
+        last = visible.stop - 1 + self.load_margin
+        if self.worker is None:
+            self.load_columns(first, last + 1)
+        else:
+            # columns on screen can't wait; the margin, plus a few columns
+            # further in the direction the camera is moving, go to the worker
+            self.load_columns(visible.start, visible.stop)
+            moved = 0 if self._last_camera_x is None else camera.x - self._last_camera_x
+            ahead_first = first - (self.prefetch if moved < 0 else 0)
+            ahead_last = last + (self.prefetch if moved > 0 else 0)
+            for cx in sorted(range(ahead_first, ahead_last + 1), key=lambda c: abs(c - visible.start)):
+                if (cx, 0) not in self.chunks:
+                    self.worker.request(cx)
+            first, last = ahead_first, ahead_last
+        self._last_camera_x = camera.x
+        self._wanted = (first - 1, last + 1)
+        top = int(camera.y) - screen_size[1]//2
+        # chunks worth pre-rendering: the visible rows of the loaded columns
+        self._near = (first, last, top // span - 1, (top + screen_size[1]) // span + 1)
+        # one column of slack on each side so walking back and forth over a
+        # chunk border doesn't regenerate the same column every frame
+        for cx in {cx for cx, _ in self.chunks}:
+            if cx < first - 1 or cx > last + 1:
+                self.unload_column(cx)
+
+    def integrate(self, budget=0.004):
+        """Take in columns finished by the worker, spending at most `budget` seconds.
+
+        New chunks are lit and then pre-rendered into the chunk cache, so the
+        frame that first shows them only has to blit.
+        """
+        deadline = time.perf_counter() + budget
+        while self.worker is not None and time.perf_counter() < deadline:
+            result = self.worker.take()
+            if result is None:
+                break
+            cx, generated = result
+            if self._wanted is not None and not self._wanted[0] <= cx <= self._wanted[1]:
+                continue  # the camera moved away while it was generating
+            self._load_column(cx, generated)
+            # a column's edges and light are final once both neighbours
+            # are loaded, so only pre-render columns that have them
+            for c in (cx - 1, cx, cx + 1):
+                if (c - 1, 0) in self.chunks and (c, 0) in self.chunks and (c + 1, 0) in self.chunks:
+                    self._prerender.extend((c, cy) for cy in range(self.rows))
+        while self._prerender and time.perf_counter() < deadline:
+            cx, cy = self._prerender.popleft()
+            chunk = self.chunks.get((cx, cy))
+            x0, x1, y0, y1 = self._near
+            if chunk is not None and x0 <= cx <= x1 and y0 <= cy <= y1:
+                self.renderer.prerender(chunk)
+
+    def tick(self, dt):
+        """Advance falling sand and flowing water by `dt` seconds."""
+        self._cell_time += dt
+        while self._cell_time >= CELL_STEP:
+            self._cell_time -= CELL_STEP
+            self.cellular.step()
 
     def draw(self, surface, camera):
-        tw = self.tile_size
-        cols = surface.get_width() // tw + 3
-        rows = surface.get_height() // tw + 3
-        start_x = max(0, camera.x // tw - cols//2)
-        start_y = max(0, camera.y // tw - rows//2)
-
-        for i in range(start_x, min(self.width, start_x + cols)):
-            for j in range(start_y, min(self.height, start_y + rows)):
-                tile = self.tiles[i][j]
-                if tile != TileType.AIR:
-                    rect = pygame.Rect((i * tw) - camera.x + surface.get_width()//2,
-                                       (j * tw) - camera.y + surface.get_height()//2,
-                                       tw, tw)
-                    pygame.draw.rect(surface, tile.color, rect)
-                    pygame.draw.rect(surface, (0,0,0), rect, 1)
+        # blit the cached surface of every chunk that intersects the screen
+        self.renderer.target = surface
+        span = CHUNK_SIZE * self.tile_size
+        sw, sh = surface.get_size()
+        left = int(camera.x) - sw//2
+        top = int(camera.y) - sh//2
+        for cx in range(left // span, (left + sw) // span + 1):
+            for cy in range(max(0, top // span), min(self.rows, (top + sh) // span + 1)):
+                if self.width is not None and not 0 <= cx * CHUNK_SIZE < self.width:
+                    continue
+                chunk = self.get_chunk(cx, cy)
+                surface.blit(self.renderer.get(chunk), (cx * span - left, cy * span - top))
 
     def world_to_tile(self, wx, wy, screen_size, camera):
         sw, sh = screen_size
@@ -54,14 +347,44 @@ class World:
         ty = (wy - sh//2 + camera.y) // self.tile_size
         return int(tx), int(ty)
 
-    def handle_mouse(self, button, mx, my, screen_size, player):
-        tx, ty = self.world_to_tile(mx, my, screen_size, player.camera)
-        if tx < 0 or ty < 0 or tx >= self.width or ty >= self.height:
+    def pick(self, mx, my, screen_size, player):
+        """Cast the block picking ray from the player's chest to the mouse.
+
+        Returns self.ray; see RayCaster for the attributes it sets.
+        """
+        sw, sh = screen_size
+        wx = mx - sw//2 + player.camera.x
+        wy = my - sh//2 + player.camera.y
+        self.ray.cast(player.x, player.y - player.height / 2, wx, wy, REACH * self.tile_size)
+        return self.ray
+
+    def draw_highlight(self, surface, camera):
+        """Outline the tile the last pick would break, or else where it would place."""
+        ray = self.ray
+        if ray.hit:
+            tx, ty, color = ray.tx, ray.ty, (255, 255, 255)
+        elif ray.can_place:
+            tx, ty, color = ray.px, ray.py, (200, 200, 200)
+        else:
             return
+        sw, sh = surface.get_size()
+        rect = (tx * self.tile_size - int(camera.x) + sw//2, ty * self.tile_size - int(camera.y) + sh//2,
+                self.tile_size, self.tile_size)
+        pygame.draw.rect(surface, color, rect, 2)
+
+    def handle_mouse(self, button, mx, my, screen_size, player):
+        ray = self.pick(mx, my, screen_size, player)
         if button == 1:
-            # left click: remove
-            self.tiles[tx][ty] = TileType.AIR
-        elif button == 3:
-            # right click: place dirt if empty
-            if self.tiles[tx][ty] == TileType.AIR:
-                self.tiles[tx][ty] = TileType.DIRT
+            # left click: remove the first block in reach, dropping it as an item
+            if ray.hit and HARDNESS[self.tile_id(ray.tx, ray.ty)] >= 0:
+                old = self.get_tile(ray.tx, ray.ty)
+                with self.edit() as batch:
+                    batch.set(ray.tx, ray.ty, TileType.AIR)
+                self.entities.drop(ray.tx, ray.ty, old)
+        elif button in (2, 3) and ray.can_place:
+            # right click: place the selected block, middle click: a torch,
+            # in the empty tile in front of the block (or at the mouse)
+            tile = player.selected if button == 3 else TileType.TORCH
+            if REPLACEABLE[self.tile_id(ray.px, ray.py)]:
+                with self.edit() as batch:
+                    batch.set(ray.px, ray.py, tile)
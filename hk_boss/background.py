@@ -0,0 +1,79 @@
+"""Cave background, pre-rendered once per screen size
+
+The gradient and the stalactites/stalagmites never change, so they are
+drawn into one surface the first time a screen size is seen and the frame
+just blits it. Parallax layers are optional: each is a strip of rock
+silhouettes as wide as the screen that wraps around horizontally and
+scrolls at `rate` times the camera offset, so a frame costs one blit for
+the base plus at most two per layer.
+"""
+import random
+import pygame
+
+# (scroll rate, color, rock height range) of each parallax layer, far to near
+PARALLAX_LAYERS = [
+	(0.15, (28, 28, 38), (60, 140)),
+	(0.4, (18, 18, 26), (30, 90)),
+]
+
+
+def _draw_base(surface):
+	w, h = surface.get_size()
+	# simple cave gradient
+	for i in range(h):
+		v = int(20 + (i / h) * 50)
+		pygame.draw.line(surface, (v, v, v + 10), (0, i), (w, i))
+	points = [(120, 40), (140, 20), (160, 40), (200, 10), (240, 40)]
+	for x, y in points:
+		pygame.draw.polygon(surface, (10, 10, 10), [(x, 0), (x + 20, y), (x - 20, y)])
+	for x in range(80, w, 120):
+		spike = 30 + (x % 3) * 10
+		pygame.draw.polygon(surface, (10, 10, 10), [(x, h), (x + 20, h - spike), (x - 20, h - spike)])
+
+
+def _draw_rocks(surface, color, heights, seed):
+	# jagged rocks along the top and bottom; the ends meet so the strip tiles
+	w, h = surface.get_size()
+	rng = random.Random(seed)
+	xs = list(range(0, w, 40)) + [w]
+	tops = [rng.randint(*heights) for _ in xs[:-1]]
+	bottoms = [rng.randint(*heights) for _ in xs[:-1]]
+	tops.append(tops[0])
+	bottoms.append(bottoms[0])
+	pygame.draw.polygon(surface, color, [(0, 0)] + [(x, y // 2) for x, y in zip(xs, tops)] + [(w, 0)])
+	pygame.draw.polygon(surface, color, [(0, h)] + [(x, h - y) for x, y in zip(xs, bottoms)] + [(w, h)])
+
+
+class CaveBackground:
+	def __init__(self, parallax=False, seed=0):
+		self.parallax = parallax
+		self.seed = seed
+		# (width, height) -> (base surface, [(rate, layer surface), ...])
+		self.cache = {}
+
+	def _layers(self, size):
+		layers = self.cache.get(size)
+		if layers is None:
+			base = pygame.Surface(size)
+			_draw_base(base)
+			strips = []
+			for i, (rate, color, heights) in enumerate(PARALLAX_LAYERS):
+				strip = pygame.Surface(size)
+				strip.fill((255, 0, 255))
+				strip.set_colorkey((255, 0, 255), pygame.RLEACCEL)
+				_draw_rocks(strip, color, heights, self.seed * 31 + i)
+				strips.append((rate, strip))
+			layers = self.cache[size] = (base, strips)
+		return layers
+
+	def draw(self, surface, camera_x=0.0):
+		"""Blit the background; parallax layers scroll with camera_x."""
+		base, strips = self._layers(surface.get_size())
+		surface.blit(base, (0, 0))
+		if self.parallax:
+			w = surface.get_width()
+			for rate, strip in strips:
+				x = -int(camera_x * rate) % w
+				surface.blit(strip, (x, 0))
+				if x:
+					surface.blit(strip, (x - w, 0))
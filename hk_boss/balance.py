@@ -0,0 +1,222 @@
+"""Headless balance simulator for the boss presets
+
+Plays many fights of each create_boss preset with a computer player and
+reports how they went: win rate, time to kill and damage taken. Fights run
+on a multiprocessing pool, without a display, as fast as sim.FightSim goes.
+
+Usage:
+	python balance.py [--fights N] [--policy heuristic|aggressive] [--workers N]
+	python balance.py --sweep health=0.6,0.8,1.0 --sweep projectile_chance=0.1,0.45 --out sweep.npz
+
+A sweep plays the same fights (the same seeds) for every combination of the
+given preset values, see main.PRESETS, and writes one row per fight to a
+NumPy .npz file with one array per column:
+	preset, seed, <each swept value>, outcome (1 won, -1 lost, 0 timed out),
+	ticks, damage_taken, boss_health
+"""
+import argparse
+import itertools
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+from main import PRESETS, create_boss
+from sim import FightSim, KEY_BITS, TICK_RATE
+
+WON, LOST, TIMED_OUT = 1, -1, 0
+
+LEFT = KEY_BITS[pygame.K_a]
+RIGHT = KEY_BITS[pygame.K_d]
+UP = KEY_BITS[pygame.K_UP]
+JUMP = KEY_BITS[pygame.K_w]
+DASH = KEY_BITS[pygame.K_LSHIFT]
+ATTACK = KEY_BITS[pygame.K_j]
+
+# arena the policy stays in, in player x
+ARENA = (40, 880)
+
+
+def _center(body):
+	return body.x + body.width / 2, body.y + body.height / 2
+
+
+def play(sim, dodge=True):
+	"""Key mask for this tick: chase the nearest boss part and hit it when in reach.
+
+	With `dodge`, first get out of swings that are coming or under way and
+	jump over projectiles flying at the player.
+	"""
+	player = sim.player
+	parts = [part for part in (sim.bosses.left, sim.bosses.right) if part.alive]
+	if not parts:
+		return 0
+	px, py = _center(player)
+	mask = 0
+	# tapping jump: the key has to be up for a tick between two jumps
+	jump = 0 if player._jump_was_pressed else JUMP
+
+	if dodge:
+		for part in parts:
+			cx, cy = _center(part)
+			if (part.telegraph or part.attacking) and math.hypot(cx - px, cy - py) < 200:
+				away = 1 if px >= cx else -1
+				if not ARENA[0] < px + away * 60 < ARENA[1]:
+					# backed against the edge of the arena, go over the boss instead
+					return jump | (RIGHT if away < 0 else LEFT)
+				mask = RIGHT if away > 0 else LEFT
+				if player.dash_timer <= 0 and abs(cx - px) < 120:
+					mask |= DASH
+				return mask
+		pool = sim.bosses.projectiles
+		n = pool.count
+		if n:
+			dx = px - pool.x[:n]
+			dy = py - pool.y[:n]
+			coming = (dx * pool.vx[:n] + dy * pool.vy[:n] > 0) & (dx * dx + dy * dy < 90 * 90)
+			if coming.any() and player.on_ground:
+				return jump
+
+	target = min(parts, key=lambda part: abs(_center(part)[0] - px))
+	tx, ty = _center(target)
+	dx, dy = tx - px, ty - py
+	if abs(dx) > 60:
+		mask |= RIGHT if dx > 0 else LEFT
+	ready = player.attack_timer <= 0 and not player.attacking
+	if dy < -60 and abs(dx) < 60:
+		# above the player: jump up to it and swing upwards
+		if player.on_ground:
+			mask |= jump
+		if ready and dy > -120:
+			mask |= ATTACK | UP
+	elif ready and abs(dx) < 110 and abs(dy) < 60:
+		mask |= ATTACK | (RIGHT if dx > 0 else LEFT)
+	return mask
+
+
+def aggressive(sim):
+	"""Like play, but never dodges."""
+	return play(sim, dodge=False)
+
+
+POLICIES = {'heuristic': play, 'aggressive': aggressive}
+
+
+def run_fight(job):
+	"""Play one fight; job is (preset, seed, tuning items, policy name, max ticks).
+
+	Returns (outcome, ticks, damage taken, boss health left). The fight
+	ends when both boss parts or the player are down, before the death
+	animations.
+	"""
+	preset, seed, tuning, policy, max_ticks = job
+	policy = POLICIES[policy]
+	sim = FightSim(create_boss(preset, seed=seed, **dict(tuning)))
+	player, left, right = sim.player, sim.bosses.left, sim.bosses.right
+	health = player.health
+	outcome = TIMED_OUT
+	while sim.tick < max_ticks:
+		sim.step(policy(sim))
+		if not left.alive and not right.alive:
+			outcome = WON
+			break
+		if player.health <= 0:
+			outcome = LOST
+			break
+	return outcome, sim.tick, health - player.health, left.health + right.health
+
+
+def run_fights(jobs, workers):
+	"""run_fight over `jobs` on a pool; columns of the results, in the order of the jobs."""
+	chunksize = max(1, len(jobs) // (workers * 8))
+	with multiprocessing.Pool(workers) as pool:
+		results = pool.map(run_fight, jobs, chunksize)
+	outcome, ticks, damage, boss_health = zip(*results) if results else ((), (), (), ())
+	return {
+		'outcome': np.array(outcome, dtype=np.int8),
+		'ticks': np.array(ticks, dtype=np.int32),
+		'damage_taken': np.array(damage, dtype=np.int16),
+		'boss_health': np.array(boss_health, dtype=np.int32),
+	}
+
+
+def _percentiles(values, scale=1.0):
+	if not len(values):
+		return '-'
+	p10, p50, p90 = np.percentile(values, (10, 50, 90)) * scale
+	return f'p10 {p10:6.1f}  p50 {p50:6.1f}  p90 {p90:6.1f}'
+
+
+def report(name, columns):
+	outcome = columns['outcome']
+	won = outcome == WON
+	n = len(outcome)
+	print(f'{name}: {n} fights')
+	print(f'  won {won.mean():6.1%}   lost {(outcome == LOST).mean():6.1%}   '
+		  f'timed out {(outcome == TIMED_OUT).mean():6.1%}')
+	print(f'  time to kill (s)  {_percentiles(columns["ticks"][won], 1.0 / TICK_RATE)}')
+	damage = columns['damage_taken']
+	print(f'  damage taken      {_percentiles(damage)}  mean {damage.mean():.2f}')
+	counts = np.bincount(damage)
+	print('  damage histogram  ' + '  '.join(f'{d}:{c}' for d, c in enumerate(counts) if c))
+
+
+def _sweep_values(text):
+	name, _, values = text.partition('=')
+	if name not in PRESETS[0] or name == 'name' or not values:
+		raise argparse.ArgumentTypeError(f'expected <preset value>=v1,v2,... not {text!r}')
+	return name, [float(v) for v in values.split(',')]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--fights', type=int, default=200, help='fights per preset, or per sweep point')
+	parser.add_argument('--preset', type=int, action='append', choices=range(len(PRESETS)),
+						help='preset to play (repeatable), all of them by default')
+	parser.add_argument('--policy', choices=sorted(POLICIES), default='heuristic')
+	parser.add_argument('--max-seconds', type=float, default=300, help='fights longer than this time out')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the first fight, the rest count up')
+	parser.add_argument('--workers', type=int, default=os.cpu_count())
+	parser.add_argument('--sweep', type=_sweep_values, action='append', metavar='NAME=V1,V2,...',
+						help='preset value to sweep (repeatable); plays every combination')
+	parser.add_argument('--out', default='sweep.npz', help='where a sweep writes its results')
+	args = parser.parse_args(argv)
+
+	presets = args.preset or list(range(len(PRESETS)))
+	max_ticks = int(args.max_seconds * TICK_RATE)
+	seeds = range(args.seed, args.seed + args.fights)
+	names = [name for name, _ in args.sweep or []]
+	points = list(itertools.product(*[values for _, values in args.sweep or []]))
+
+	jobs = [(preset, seed, tuple(zip(names, point)), args.policy, max_ticks)
+			for preset in presets for point in points for seed in seeds]
+	print(f'{len(jobs)} fights, {args.policy} policy, {args.workers} workers')
+	start = time.perf_counter()
+	columns = run_fights(jobs, args.workers)
+	seconds = time.perf_counter() - start
+	print(f'done in {seconds:.1f} s ({columns["ticks"].sum() / seconds:.0f} ticks/s)\n')
+
+	# the jobs are in blocks of args.fights, one block per preset and sweep point
+	per_fight = {
+		'preset': np.array([job[0] for job in jobs], dtype=np.int8),
+		'seed': np.array([job[1] for job in jobs], dtype=np.int64),
+	}
+	for i, name in enumerate(names):
+		per_fight[name] = np.array([job[2][i][1] for job in jobs])
+	per_fight.update(columns)
+	for block in range(0, len(jobs), args.fights):
+		preset, _, tuning, _, _ = jobs[block]
+		label = PRESETS[preset]['name'] + ''.join(f', {name}={value:g}' for name, value in tuning)
+		report(label, {key: values[block:block + args.fights] for key, values in columns.items()})
+	if args.sweep:
+		np.savez(args.out, **per_fight)
+		print(f'\nwrote {len(jobs)} rows to {args.out}')
+
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
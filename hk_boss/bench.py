@@ -0,0 +1,442 @@
+"""Micro-benchmarks for the hk_boss demo
+
+Usage:
+	python bench.py text [--frames N]
+	python bench.py background [--frames N]
+	python bench.py projectiles [--count N] [--frames N]
+	python bench.py collision [--bosses N] [--bullets N] [--fights N] [--ticks N]
+	python bench.py sim [--ticks N] [--seed N]
+	python bench.py replay [--ticks N] [--seeks N]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from main import SCREEN_W, SCREEN_H, create_boss, draw_menu, draw_hint, draw_overlay
+from player import Player
+from hud import HUD
+from text import cache
+from background import CaveBackground
+from projectiles import ProjectilePool, spawn_volley
+from boss import DoubleBoss
+from collision import CollisionWorld, SMALL_WORLD, PLAYER, PROJECTILE
+from sim import FightSim, INPUT_KEYS, TICK_RATE
+from replay import Recording, Replay
+from balance import play
+
+
+def _legacy_draw_menu(surface, selection):
+	# draw_menu as it was, with four SysFont lookups per frame
+	surface.fill((12, 12, 18))
+	font = pygame.font.SysFont(None, 64)
+	t = font.render("Choose a Boss", True, (230, 220, 200))
+	surface.blit(t, (SCREEN_W // 2 - t.get_width() // 2, 48))
+	small = pygame.font.SysFont(None, 24)
+	for x, desc in ((SCREEN_W // 4 - 160, ["Hornet Twins", "Fast, lots of projectiles", "Lower HP, aggressive"]),
+			(SCREEN_W * 3 // 4 - 160, ["Mantis Overlords", "High HP, big melee swings", "Slower movement"])):
+		pygame.draw.rect(surface, (40, 40, 60), (x, 160, 320, 240))
+		title = pygame.font.SysFont(None, 36).render(desc[0], True, (240, 220, 200))
+		surface.blit(title, (x + 16, 172))
+		for i, line in enumerate(desc[1:]):
+			surface.blit(small.render(line, True, (200, 200, 200)), (x + 16, 220 + i * 22))
+	sel_x = SCREEN_W // 4 - 160 if selection == 0 else SCREEN_W * 3 // 4 - 160
+	pygame.draw.rect(surface, (200, 180, 60), (sel_x - 6, 154, 332, 252), width=4)
+	hint = small.render("Use ← → or A/D to choose, Enter to start", True, (180, 180, 180))
+	surface.blit(hint, (SCREEN_W // 2 - hint.get_width() // 2, SCREEN_H - 80))
+
+
+def _legacy_play_text(surface, hud, player, p):
+	# the HUD title, return hint and overlay text as they were drawn
+	text = pygame.font.SysFont('arial', 18).render('DOUBLE HOLLOW-BUG', True, (230, 230, 230))
+	surface.blit(text, (surface.get_width() - text.get_width() - 12, 12))
+	hint = pygame.font.SysFont(None, 20).render("Press R to return to menu", True, (160, 160, 160))
+	surface.blit(hint, (SCREEN_W - hint.get_width() - 12, SCREEN_H - 28))
+	overlay = pygame.Surface((SCREEN_W, SCREEN_H), pygame.SRCALPHA)
+	overlay.fill((10, 0, 0, int(220 * p)))
+	surface.blit(overlay, (0, 0))
+	text = pygame.font.SysFont(None, 72).render("GAME OVER", True, (240, 220, 200))
+	surface.blit(text, (SCREEN_W // 2 - text.get_width() // 2, SCREEN_H // 2 - 40))
+	sub = pygame.font.SysFont(None, 28).render("Press R to return to menu", True, (220, 200, 180))
+	surface.blit(sub, (SCREEN_W // 2 - sub.get_width() // 2, SCREEN_H // 2 + 40))
+
+
+def _per_frame(draw, frames):
+	draw(0)  # font lookup and first renders aren't part of the steady state
+	t0 = time.perf_counter()
+	for frame in range(frames):
+		draw(frame)
+	return (time.perf_counter() - t0) / frames
+
+
+def bench_text(args):
+	pygame.init()
+	surface = pygame.Surface((SCREEN_W, SCREEN_H))
+	player = Player(200, 450)
+	player.finished_death = True
+	hud = HUD(player, create_boss(0))
+
+	def play_frame(frame):
+		hud.draw(surface)
+		draw_hint(surface)
+		draw_overlay(surface, player, 0.5)
+
+	def legacy_play_frame(frame):
+		# the bars and hearts are drawn the same way in both
+		hud.draw(surface)
+		_legacy_play_text(surface, hud, player, 0.5)
+
+	print(f'text drawing per frame, {args.frames} frames')
+	for name, legacy, cached in (
+			('menu', lambda f: _legacy_draw_menu(surface, f & 1), lambda f: draw_menu(surface, f & 1)),
+			('HUD, hint and overlay', legacy_play_frame, play_frame)):
+		before = _per_frame(legacy, args.frames)
+		after = _per_frame(cached, args.frames)
+		print(f'  {name:<22} SysFont + render {before * 1000:7.3f} ms   cached {after * 1000:7.3f} ms')
+	print(f'  cache: {len(cache.fonts)} fonts, {len(cache.surfaces)} surfaces, '
+		  f'{cache.hits} hits, {cache.misses} misses')
+
+
+def _legacy_background(surface):
+	# the gradient line by line and the spikes, as main.py drew them every frame
+	for i in range(SCREEN_H):
+		v = int(20 + (i / SCREEN_H) * 50)
+		pygame.draw.line(surface, (v, v, v + 10), (0, i), (SCREEN_W, i))
+	points = [(120, 40), (140, 20), (160, 40), (200, 10), (240, 40)]
+	for x, y in points:
+		pygame.draw.polygon(surface, (10, 10, 10), [(x, 0), (x + 20, y), (x - 20, y)])
+	for x in range(80, SCREEN_W, 120):
+		h = 30 + (x % 3) * 10
+		pygame.draw.polygon(surface, (10, 10, 10), [(x, SCREEN_H), (x + 20, SCREEN_H - h), (x - 20, SCREEN_H - h)])
+
+
+def bench_background(args):
+	pygame.init()
+	screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+	surface = screen.copy()
+	flat = CaveBackground()
+	layered = CaveBackground(parallax=True)
+	_legacy_background(surface)
+	expected = pygame.image.tobytes(surface, 'RGB')
+	flat.draw(surface)
+	same = pygame.image.tobytes(surface, 'RGB') == expected
+	print(f'background per frame at {SCREEN_W}x{SCREEN_H}, {args.frames} frames '
+		  f'(cached image {"matches" if same else "DIFFERS from"} the line drawing)')
+	for name, draw in (('lines and polygons', lambda f: _legacy_background(surface)),
+			('cached, one blit', lambda f: flat.draw(surface)),
+			('cached + 2 parallax layers', lambda f: layered.draw(surface, f * 7.0))):
+		print(f'  {name:<28} {_per_frame(draw, args.frames) * 1000:7.3f} ms')
+
+
+class _LegacyProjectile:
+	# the projectile class bosses used before ProjectilePool
+	def __init__(self, x, y, vx, vy, radius=6, color=(200,160,60), life=3.0, damage=1):
+		self.x = x
+		self.y = y
+		self.vx = vx
+		self.vy = vy
+		self.radius = radius
+		self.color = color
+		self.life = life
+		self.damage = damage
+		self.alive = True
+
+	def update(self, dt):
+		self.x += self.vx * dt
+		self.y += self.vy * dt
+		self.life -= dt
+		if self.life <= 0:
+			self.alive = False
+
+	def draw(self, surface):
+		r = int(self.radius)
+		pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), r)
+
+	def get_rect(self):
+		return pygame.Rect(int(self.x - self.radius), int(self.y - self.radius), int(self.radius*2), int(self.radius*2))
+
+
+def _legacy_volley(center_x, center_y, speed, count, spread, life):
+	# spawn_volley as it was, one projectile object per bullet
+	projs = []
+	for i in range(count):
+		angle = math.pi/2 - spread + (i / max(1, count - 1)) * (spread * 2)
+		projs.append(_LegacyProjectile(center_x, center_y, math.cos(angle) * speed, math.sin(angle) * speed, life=life))
+	return projs
+
+
+def bench_projectiles(args):
+	pygame.init()
+	surface = pygame.Surface((SCREEN_W, SCREEN_H))
+	hitbox = pygame.Rect(200, 450, 28, 44)
+	dt = 1 / 60
+	print(f'{args.count} live projectiles, {args.frames} frames of update + player collision + draw')
+
+	def run(frame, live, refill):
+		rng = random.Random(0)
+		times = []
+		for i in range(args.frames + 1):
+			t0 = time.perf_counter()
+			# volleys keep the number of live bullets at the target; random
+			# lifetimes so the first ones don't all expire on the same frame
+			while live() < args.count:
+				refill(rng.uniform(0, SCREEN_W), rng.uniform(0, SCREEN_H / 2), rng.uniform(60, 260),
+					   rng.uniform(0.5, 3.0))
+			frame()
+			if i == 0:
+				continue  # the first frame spawns all of them at once
+			times.append(time.perf_counter() - t0)
+		times.sort()
+		return sum(times) / len(times), times[int(len(times) * 0.99)]
+
+	# the old DoubleBoss loop: list copy, update, list.remove, a Rect per bullet
+	bullets = []
+
+	def legacy_frame():
+		for p in list(bullets):
+			p.update(dt)
+			if not p.alive:
+				bullets.remove(p)
+		for rect in [p.get_rect() for p in bullets]:
+			rect.colliderect(hitbox)
+		for p in bullets:
+			p.draw(surface)
+
+	pool = ProjectilePool()
+	world = CollisionWorld()
+
+	def pool_frame():
+		pool.update(dt)
+		# collision as the game does it now
+		world.clear()
+		world.add_rect(PLAYER, None, hitbox)
+		n = pool.count
+		world.add_circles(PROJECTILE, pool, pool.x[:n], pool.y[:n], pool.radius[:n])
+		world.contacts()
+		pool.draw(surface)
+
+	for name, frame, live, refill in (
+			('list of projectile objects', legacy_frame, lambda: len(bullets),
+				lambda x, y, speed, life: bullets.extend(_legacy_volley(x, y, speed, 7, 1.2, life))),
+			('ProjectilePool', pool_frame, lambda: len(pool),
+				lambda x, y, speed, life: spawn_volley(pool, x, y, speed, 7, 1.2, life=life))):
+		mean, p99 = run(frame, live, refill)
+		print(f'  {name:<28} mean {mean * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  '
+			  f'({"fits" if p99 < 1 / 60 else "misses"} a 60 FPS frame)')
+
+
+def bench_collision(args):
+	pygame.init()
+	rng = random.Random(0)
+	player = Player(SCREEN_W / 2, 450)
+	player.attacking = True
+	bosses = []
+	for _ in range(args.bosses):
+		boss = DoubleBoss(rng.uniform(100, SCREEN_W - 100), rng.uniform(80, 500))
+		for part in (boss.left, boss.right):
+			part.attacking = rng.random() < 0.5
+			part.attack_t = rng.uniform(0, 0.9)
+		for _ in range(args.bullets // (7 * args.bosses)):
+			spawn_volley(boss.projectiles, rng.uniform(0, SCREEN_W), rng.uniform(0, SCREEN_H), 100, 7, 1.2)
+		bosses.append(boss)
+	bullets = sum(len(boss.projectiles) for boss in bosses)
+	print(f'{2 * args.bosses} boss parts, {bullets} projectiles, one player')
+
+	def legacy():
+		# what main.py did, for every boss: a Rect per hitbox and bullet, colliderect each
+		contacts = 0
+		hitbox = player.get_hitbox()
+		attack = player.get_attack_hitbox()
+		for boss in bosses:
+			for part in (boss.left, boss.right):
+				hb = part.get_sword_hitbox()
+				if hb:
+					contacts += hb.colliderect(hitbox)
+			pool = boss.projectiles
+			n = pool.count
+			left = (pool.x[:n] - pool.radius[:n]).astype(int).tolist()
+			top = (pool.y[:n] - pool.radius[:n]).astype(int).tolist()
+			size = (pool.radius[:n] * 2).astype(int).tolist()
+			for ph in [pygame.Rect(l, t, d, d) for l, t, d in zip(left, top, size)]:
+				contacts += ph.colliderect(hitbox)
+			for part in (boss.left, boss.right):
+				contacts += part.alive and attack.colliderect(part.get_rect())
+		return contacts
+
+	world = CollisionWorld()
+
+	def grid():
+		world.clear()
+		player.add_colliders(world)
+		for boss in bosses:
+			boss.add_colliders(world)
+		return len(world.contacts())
+
+	for name, run in (('Python loops, bounding rects', legacy), ('CollisionWorld, exact circles', grid)):
+		found = run()
+		seconds = _per_frame(lambda f: run(), 50)
+		print(f'  {name:<30} {seconds * 1000:7.2f} ms/frame  {found} contacts')
+
+	# real fights hold a few shapes most of the time, where contacts() skips the grid
+	def fight(preset, seed, small_world):
+		sim = FightSim(create_boss(preset, seed=seed))
+		names = {id(sim.player): 'player', id(sim.bosses.left): 'left', id(sim.bosses.right): 'right',
+				 id(sim.bosses.projectiles): 'projectiles'}
+		world = sim.collisions
+		contacts = world.contacts
+		log = []
+
+		def recorded():
+			found = contacts(small_world)
+			log.append([(c.layer, names[id(c.owner)], c.index, c.other_layer, names[id(c.other_owner)], c.other_index)
+						for c in found])
+			return found
+
+		world.contacts = recorded
+		start = time.perf_counter()
+		while sim.tick < args.ticks and not sim.over:
+			sim.step(play(sim))
+		return sim.state(), log, sim.tick, time.perf_counter() - start
+
+	print(f'{args.fights} headless fights, heuristic player, at most {args.ticks} ticks each')
+	ticks = {SMALL_WORLD: 0, 0: 0}
+	seconds = {SMALL_WORLD: 0.0, 0: 0.0}
+	for i in range(args.fights):
+		runs = {}
+		for small_world in (SMALL_WORLD, 0):
+			state, log, n, elapsed = fight(i % 2, i, small_world)
+			runs[small_world] = state, log
+			ticks[small_world] += n
+			seconds[small_world] += elapsed
+		assert runs[SMALL_WORLD][0] == runs[0][0], f'fight {i}: end states differ'
+		assert runs[SMALL_WORLD][1] == runs[0][1], f'fight {i}: contacts differ'
+	for small_world, name in ((0, 'grid always'), (SMALL_WORLD, f'all pairs up to {SMALL_WORLD} shapes')):
+		print(f'  {name:<30} {ticks[small_world] / seconds[small_world]:7.0f} ticks/s')
+	print('  end states and contacts, in order, identical on every tick')
+
+
+def _scripted_inputs(seed, ticks):
+	# a key mask per tick, holding a random set of keys for a few ticks at a time
+	rng = random.Random(seed)
+	masks = []
+	while len(masks) < ticks:
+		mask = sum(1 << i for i in range(len(INPUT_KEYS)) if rng.random() < 0.3)
+		masks += [mask] * rng.randint(1, 20)
+	return masks[:ticks]
+
+
+def bench_sim(args):
+	pygame.init()
+	masks = _scripted_inputs(args.seed, args.ticks)
+
+	def run(choice, seed):
+		sim = FightSim(create_boss(choice, seed=seed))
+		start = time.perf_counter()
+		for mask in masks:
+			sim.step(mask)
+		return sim, time.perf_counter() - start
+
+	print(f'{args.ticks} ticks of headless simulation with scripted input, seed {args.seed}')
+	for choice, name in ((0, 'Hornet Twins'), (1, 'Mantis Overlords')):
+		first, seconds = run(choice, args.seed)
+		second, _ = run(choice, args.seed)
+		other, _ = run(choice, args.seed + 1)
+		same = first.state() == second.state()
+		print(f'  {name:<18} {args.ticks / seconds:9.0f} ticks/s  '
+			  f'same seed {"identical" if same else "DIFFERENT"}, '
+			  f'other seed {"differs" if other.state() != first.state() else "identical"}')
+
+
+def bench_replay(args):
+	pygame.init()
+	screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
+	rng = random.Random(0)
+	recording = Recording(1, rng.getrandbits(32), _scripted_inputs(0, args.ticks))
+	# the fight as played, with its state at some ticks to check the seeks against
+	sim = FightSim(create_boss(recording.choice, seed=recording.seed))
+	targets = sorted(rng.randrange(args.ticks + 1) for _ in range(args.seeks))
+	expected = {}
+	for mask in recording.masks:
+		if sim.tick in targets:
+			expected[sim.tick] = sim.state()
+		sim.step(mask)
+	expected[sim.tick] = sim.state()
+
+	path = os.path.join(tempfile.mkdtemp(), 'fight.npz')
+	recording.save(path)
+	size = os.path.getsize(path)
+	recording = Recording.load(path)
+	print(f'{args.ticks} ticks ({args.ticks / TICK_RATE:.0f} s of fight), saved in {size} bytes')
+
+	replay = Replay(recording, create_boss)
+	start = time.perf_counter()
+	replay.advance(args.ticks)
+	seconds = time.perf_counter() - start
+	print(f'  replay without drawing   {args.ticks / seconds / TICK_RATE:6.0f}x real time, '
+		  f'end state {"identical" if replay.sim.state() == expected[args.ticks] else "DIFFERENT"}')
+
+	rng.shuffle(targets)
+	start = time.perf_counter()
+	wrong = sum(replay.seek(tick).state() != expected[tick] for tick in targets)
+	seconds = time.perf_counter() - start
+	print(f'  seek to a random tick    {seconds / len(targets) * 1000:6.2f} ms each, '
+		  f'{len(targets) - wrong}/{len(targets)} states identical')
+
+	# drawing picks up from a seek point like a live fight
+	sim = replay.seek(targets[0])
+	times = []
+	for i in range(120):
+		replay.advance(1)
+		start = time.perf_counter()
+		sim.draw(screen, 0.5)
+		times.append(time.perf_counter() - start)
+	print(f'  drawing from tick {targets[0]:<6}  mean {sum(times) / len(times) * 1000:.2f} ms, '
+		  f'max {max(times) * 1000:.2f} ms at tick {targets[0] + times.index(max(times)) + 1}')
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	sub = parser.add_subparsers(dest='command', required=True)
+
+	p = sub.add_parser('text', help='menu and HUD text drawing, SysFont per frame vs cached')
+	p.add_argument('--frames', type=int, default=300)
+	p.set_defaults(func=bench_text)
+
+	p = sub.add_parser('background', help='cave background, drawn per frame vs cached layers')
+	p.add_argument('--frames', type=int, default=300)
+	p.set_defaults(func=bench_background)
+
+	p = sub.add_parser('projectiles', help='bullet-hell load: object list vs NumPy projectile pool')
+	p.add_argument('--count', type=int, default=10000)
+	p.add_argument('--frames', type=int, default=300)
+	p.set_defaults(func=bench_projectiles)
+
+	p = sub.add_parser('collision', help='per-frame contact tests, Python loops vs the collision world')
+	p.add_argument('--bosses', type=int, default=50)
+	p.add_argument('--bullets', type=int, default=10000)
+	p.add_argument('--fights', type=int, default=8)
+	p.add_argument('--ticks', type=int, default=3600)
+	p.set_defaults(func=bench_collision)
+
+	p = sub.add_parser('sim', help='fixed-timestep fight simulation: determinism and ticks per second')
+	p.add_argument('--ticks', type=int, default=20000)
+	p.add_argument('--seed', type=int, default=1)
+	p.set_defaults(func=bench_sim)
+
+	p = sub.add_parser('replay', help='recorded fight: size, replay speed, seeking and drawing from a seek')
+	p.add_argument('--ticks', type=int, default=36000)
+	p.add_argument('--seeks', type=int, default=50)
+	p.set_defaults(func=bench_replay)
+
+	args = parser.parse_args(argv)
+	args.func(args)
+
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -1,11 +1,21 @@
 import pygame
 import math
 import random
-from projectiles import spawn_volley
+from projectiles import ProjectilePool, spawn_volley
+from text import render_text
+from collision import BOSS_BODY, BOSS_ATTACK, PROJECTILE
+
+
+def random_stream(seed, name):
+	"""Random stream of one entity of a fight; seeded from the fight's seed and
+	the entity's name, or unpredictable if seed is None."""
+	return random.Random(None if seed is None else f'{seed}:{name}')
 
 
 class BossPart:
-	def __init__(self, x, y, color=(90, 160, 70), max_health=90):
+	def __init__(self, x, y, color=(90, 160, 70), max_health=90, rng=None):
+		# own random stream, so a seeded fight plays out the same every time
+		self.rng = rng if rng is not None else random.Random()
 		self.base_x = x
 		self.base_y = y
 		self.x = x
@@ -15,7 +25,7 @@ class BossPart:
 		self.color = color
 		self.attack_timer = 0.0
 		# attack more frequently for higher difficulty
-		self.attack_cooldown = 1.1 + random.random() * 0.6
+		self.attack_cooldown = 1.1 + self.rng.random() * 0.6
 		self.attacking = False
 		self.attack_t = 0.0
 		# telegraph (brief warning) before the attack begins
@@ -36,24 +46,26 @@ class BossPart:
 		self.dead_duration = 1.6
 		self.finished_death = False
 		self.hurt_t = 0.0
+		# seconds of simulated time this part has been moving
+		self.clock = 0.0
 		# independent movement parameters (horizontal + vertical)
-		self.phase = random.random() * 10.0
+		self.phase = self.rng.random() * 10.0
 		# horizontal movement: larger but slower overall
-		self.osc_amp = 60 + random.random() * 30
-		self.osc_speed = 1.6 + random.random() * 1.2
+		self.osc_amp = 60 + self.rng.random() * 30
+		self.osc_speed = 1.6 + self.rng.random() * 1.2
 		# vertical movement parameters so parts can move up/down across the room
-		self.phase_y = random.random() * 10.0
-		self.osc_amp_y = 80 + random.random() * 100
-		self.osc_speed_y = 0.7 + random.random() * 0.9
+		self.phase_y = self.rng.random() * 10.0
+		self.osc_amp_y = 80 + self.rng.random() * 100
+		self.osc_speed_y = 0.7 + self.rng.random() * 0.9
 
 		# erratic jitter parameters (random impulses to make movement less predictable)
-		self.jitter_next = random.uniform(0.6, 1.4)
+		self.jitter_next = self.rng.uniform(0.6, 1.4)
 		self.jitter_offset_x = 0.0
 		self.jitter_offset_y = 0.0
 		# reduce jitter strength to make movement less twitchy
-		self.jitter_strength = 10 + random.random() * 30
+		self.jitter_strength = 10 + self.rng.random() * 30
 		# small continuous noise to vary oscillation speed slightly
-		self.osc_speed_variance = random.random() * 0.2
+		self.osc_speed_variance = self.rng.random() * 0.2
 
 		# sprite
 		self.sprite = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
@@ -89,21 +101,22 @@ class BossPart:
 			return
 
 		self.hurt_t = max(0.0, self.hurt_t - dt)
+		self.clock += dt
 
 		# independent faster horizontal oscillation around base_x
-		t = pygame.time.get_ticks() / 1000.0 + self.phase
+		t = self.clock + self.phase
 		target_x = self.base_x + math.sin(t * self.osc_speed) * self.osc_amp
 
 		# add a small random variance to osc speed so each update feels different
-		self.osc_speed += (random.random() - 0.5) * self.osc_speed_variance * dt
+		self.osc_speed += (self.rng.random() - 0.5) * self.osc_speed_variance * dt
 
 		# apply jitter impulses occasionally
 		self.jitter_next -= dt
 		if self.jitter_next <= 0:
 			# pick a new random offset and reset timer
-			self.jitter_offset_x = (random.random() * 2.0 - 1.0) * self.jitter_strength
-			self.jitter_offset_y = (random.random() * 2.0 - 1.0) * (self.jitter_strength * 0.6)
-			self.jitter_next = random.uniform(0.25, 1.2)
+			self.jitter_offset_x = (self.rng.random() * 2.0 - 1.0) * self.jitter_strength
+			self.jitter_offset_y = (self.rng.random() * 2.0 - 1.0) * (self.jitter_strength * 0.6)
+			self.jitter_next = self.rng.uniform(0.25, 1.2)
 
 		# roaming: occasionally pick a roam target across the room
 		if not hasattr(self, 'roam_target_x'):
@@ -111,10 +124,10 @@ class BossPart:
 			self.roam_target_x = self.base_x
 			self.roam_target_y = self.base_y
 		# occasionally change roam target
-		if random.random() < dt * 0.2:
+		if self.rng.random() < dt * 0.2:
 			# choose a new roam point within room bounds (assume screen ~960x640)
-			self.roam_target_x = random.uniform(100, 860)
-			self.roam_target_y = random.uniform(80, 520)
+			self.roam_target_x = self.rng.uniform(100, 860)
+			self.roam_target_y = self.rng.uniform(80, 520)
 		# blend base oscillation target with roam target so bosses cross the room
 		blend_t = 0.35
 		target_x = (target_x * (1.0 - blend_t)) + (self.roam_target_x * blend_t) + self.jitter_offset_x
@@ -151,8 +164,8 @@ class BossPart:
 			self.telegraph_t += dt
 			if self.telegraph_t >= self.telegraph_len:
 				self.telegraph = False
-				# decide attack type: 25% chance to use projectile volley instead of melee
-				self.next_attack_is_projectile = (random.random() < 0.25)
+				# decide attack type: projectile_chance to use projectile volley instead of melee
+				self.next_attack_is_projectile = (self.rng.random() < self.projectile_chance)
 				# reset spawned flag
 				self.projectile_spawned = False
 				# mark attacking state
@@ -167,8 +180,8 @@ class BossPart:
 				self.attacking = False
 				self.attack_t = 0.0
 
-	def get_sword_hitbox(self, facing=1):
-		# legacy single-side sword hitbox (kept for compatibility) -> replaced by circular hitbox
+	def get_sword_circle(self):
+		"""(cx, cy, radius) of the circular attack, or None when not attacking."""
 		if not self.alive:
 			return None
 		if not self.attacking:
@@ -183,7 +196,15 @@ class BossPart:
 		# center of the part
 		cx = int(self.x + self.width / 2)
 		cy = int(self.y + self.height / 2)
-		# return a rect that bounds the circular area (main code expects rects)
+		return cx, cy, radius
+
+	def get_sword_hitbox(self, facing=1):
+		# legacy single-side sword hitbox (kept for compatibility) -> replaced by circular hitbox
+		circle = self.get_sword_circle()
+		if circle is None:
+			return None
+		cx, cy, radius = circle
+		# a rect that bounds the circular area
 		return pygame.Rect(cx - radius, cy - radius, radius * 2, radius * 2)
 
 	def get_predicted_sword_hitbox(self, facing=1):
@@ -277,24 +298,25 @@ class BossPart:
 
 class DoubleBoss:
 	"""Manages two boss parts attacking in offset patterns"""
-	def __init__(self, x, y):
+	def __init__(self, x, y, seed=None):
+		self.rng = random_stream(seed, 'boss')
 		# left and right parts
 		# give each part much more health so defeating both requires many attacks
 		# double the base health so they require twice as many hits
-		self.left = BossPart(x - 88, y, color=(100, 150, 90), max_health=90 * 2)
-		self.right = BossPart(x + 24, y, color=(130, 110, 90), max_health=90 * 2)
+		self.left = BossPart(x - 88, y, color=(100, 150, 90), max_health=90 * 2, rng=random_stream(seed, 'left'))
+		self.right = BossPart(x + 24, y, color=(130, 110, 90), max_health=90 * 2, rng=random_stream(seed, 'right'))
 		# ensure initial health values reflect doubled max
 		self.left.health = self.left.max_health
 		self.right.health = self.right.max_health
 		# ensure both parts share the exact same cooldown window
-		base_cd = 1.1 + random.random() * 0.6
+		base_cd = 1.1 + self.rng.random() * 0.6
 		self.left.attack_cooldown = base_cd
 		self.right.attack_cooldown = base_cd
 		# offset their timers so attacks are interleaved (right will attack halfway through the cooldown)
 		self.right.attack_timer = base_cd * 0.5
 		self.left.attack_timer = 0.0
-		# projectile list for boss volleys
-		self.projectiles = []
+		# projectiles of the boss volleys
+		self.projectiles = ProjectilePool()
 		# win animation state
 		self.win = False
 		self.win_t = 0.0
@@ -312,15 +334,11 @@ class DoubleBoss:
 				# spawn volley centered on the part
 				cx = int(part.x + part.width / 2)
 				cy = int(part.y + part.height / 2)
-				vol = spawn_volley(cx, cy, speed=260, count=7, spread=1.2)
-				self.projectiles.extend(vol)
+				spawn_volley(self.projectiles, cx, cy, speed=260, count=7, spread=1.2)
 				part.projectile_spawned = True
 
 		# update projectiles
-		for p in list(self.projectiles):
-			p.update(dt)
-			if not p.alive:
-				self.projectiles.remove(p)
+		self.projectiles.update(dt)
 
 		# check for win (both parts finished death)
 		if not self.win and getattr(self.left, 'finished_death', False) and getattr(self.right, 'finished_death', False):
@@ -330,30 +348,18 @@ class DoubleBoss:
 		if self.win:
 			self.win_t += dt
 
-	def get_active_hitboxes(self):
-		h = []
-		for part in (self.left, self.right):
-			hb = part.get_sword_hitbox()
-			if hb:
-				h.append(hb)
-		return h
-
-	def get_projectile_hitboxes(self):
-		h = []
-		for p in self.projectiles:
-			h.append(p.get_rect())
-		return h
-
-	def hit_by_player(self, rect, damage):
-		"""Apply damage if the player's attack rect overlaps a living part."""
-		hit = False
+	def add_colliders(self, world):
+		"""Put the living parts, their attacks and the projectiles in a CollisionWorld."""
 		for part in (self.left, self.right):
 			if not part.alive:
 				continue
-			if rect.colliderect(part.get_rect()):
-				part.take_damage(damage)
-				hit = True
-		return hit
+			world.add_rect(BOSS_BODY, part, part.get_rect())
+			circle = part.get_sword_circle()
+			if circle:
+				world.add_circle(BOSS_ATTACK, part, *circle)
+		pool = self.projectiles
+		n = pool.count
+		world.add_circles(PROJECTILE, pool, pool.x[:n], pool.y[:n], pool.radius[:n])
 
 	def draw(self, surface):
 		# draw simple shadows under each alive part
@@ -365,8 +371,7 @@ class DoubleBoss:
 		self.right.draw(surface)
 
 		# draw projectiles
-		for p in self.projectiles:
-			p.draw(surface)
+		self.projectiles.draw(surface)
 
 		# win animation: pulsing ring and floating text when both parts are defeated
 		if self.win:
@@ -380,8 +385,7 @@ class DoubleBoss:
 			pygame.draw.circle(surf, (240, 220, 140, alpha), (radius, radius), radius, width=6)
 			surface.blit(surf, (cx - radius, cy - radius))
 			# floating "Victory" text
-			font = pygame.font.SysFont(None, 56)
-			text = font.render("VICTORY", True, (240, 220, 160))
+			text = render_text("VICTORY", 56, (240, 220, 160))
 			# slight bobbing
 			yoff = int(math.sin(self.win_t * 6.0) * 8)
 			surface.blit(text, (cx - text.get_width()//2, cy - 24 + yoff))
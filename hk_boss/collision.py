@@ -0,0 +1,207 @@
+"""Collision world: one broad phase pass over everything that can touch
+
+Every frame the player, the bosses and the projectiles add their shapes
+(rects and circles) to a CollisionWorld, each on a layer. contacts()
+returns the touching pairs for the layer pairs listed in INTERACTIONS, so
+bullets are never tested against bullets or bosses against each other.
+
+Broad phase: a uniform grid of CELL_SIZE pixel cells. Each shape is
+entered in every cell its bounding box covers; for each interacting layer
+pair the entries of the smaller layer are sorted by cell and those of the
+larger one find the ones in their cell with a binary search.
+Narrow phase: exact rect/rect, circle/rect and circle/circle tests on the
+candidate pairs. All of it is NumPy work, so the cost barely depends on
+the number of projectiles. A world of at most SMALL_WORLD shapes (a fight
+with no bullets in the air) skips the grid and tests every pair of the
+interacting layers instead, which costs less than setting the grid up.
+"""
+from collections import namedtuple
+import numpy as np
+
+CELL_SIZE = 64
+SMALL_WORLD = 32
+
+PLAYER = 0
+BOSS_BODY = 1
+BOSS_ATTACK = 2
+PROJECTILE = 3
+PLAYER_ATTACK = 4
+
+# layer pairs that are tested; contacts list them in this order
+INTERACTIONS = [
+	(PLAYER, BOSS_ATTACK),
+	(PLAYER, PROJECTILE),
+	(PLAYER_ATTACK, BOSS_BODY),
+]
+
+RECT = 0
+CIRCLE = 1
+
+# owner and index of both shapes; index tells apart the shapes of an owner
+# added with add_circles (e.g. the bullets of a ProjectilePool)
+Contact = namedtuple('Contact', 'layer owner index other_layer other_owner other_index')
+
+
+class CollisionWorld:
+	def __init__(self, cell_size=CELL_SIZE):
+		self.cell_size = cell_size
+		self.clear()
+
+	def clear(self):
+		self.layers = []
+		self.kinds = []
+		# shape parameters: rects are (left, top, right, bottom), circles (x, y, r, r)
+		self.a = []
+		self.b = []
+		self.c = []
+		self.d = []
+		self.owners = []
+		self.indices = []
+		# shapes added in bulk, as (layer, owner, xs, ys, rs)
+		self.batches = []
+
+	def add_rect(self, layer, owner, rect, index=0):
+		self.layers.append(layer)
+		self.kinds.append(RECT)
+		self.a.append(rect.left)
+		self.b.append(rect.top)
+		self.c.append(rect.right)
+		self.d.append(rect.bottom)
+		self.owners.append(owner)
+		self.indices.append(index)
+
+	def add_circle(self, layer, owner, x, y, r, index=0):
+		self.layers.append(layer)
+		self.kinds.append(CIRCLE)
+		self.a.append(x)
+		self.b.append(y)
+		self.c.append(r)
+		self.d.append(r)
+		self.owners.append(owner)
+		self.indices.append(index)
+
+	def add_circles(self, layer, owner, xs, ys, rs):
+		"""Add circles i = 0..len(xs)-1 of `owner` from arrays."""
+		if len(xs):
+			self.batches.append((layer, owner, np.asarray(xs, dtype=float), np.asarray(ys, dtype=float),
+								 np.broadcast_to(np.asarray(rs, dtype=float), np.shape(xs))))
+
+	def _arrays(self):
+		n = len(self.layers)
+		layer = np.array(self.layers, dtype=np.int8)
+		kind = np.array(self.kinds, dtype=np.int8)
+		shape = np.array([self.a, self.b, self.c, self.d], dtype=float).reshape(4, n)
+		index = np.array(self.indices, dtype=np.intp)
+		owner = np.arange(n)  # position in self.owners, or -1 - batch number
+		if self.batches:
+			sizes = np.array([len(batch[2]) for batch in self.batches])
+			starts = np.cumsum(sizes) - sizes
+			m = int(sizes.sum())
+			rs = np.concatenate([batch[4] for batch in self.batches])
+			layer = np.concatenate([layer, np.repeat([batch[0] for batch in self.batches], sizes)])
+			kind = np.concatenate([kind, np.full(m, CIRCLE, dtype=np.int8)])
+			shape = np.concatenate([shape, [np.concatenate([batch[2] for batch in self.batches]),
+											np.concatenate([batch[3] for batch in self.batches]), rs, rs]], axis=1)
+			index = np.concatenate([index, np.arange(m) - np.repeat(starts, sizes)])
+			owner = np.concatenate([owner, np.repeat(-1 - np.arange(len(sizes)), sizes)])
+		return layer, kind, shape, index, owner
+
+	def _owner(self, ref):
+		return self.owners[ref] if ref >= 0 else self.batches[-1 - ref][1]
+
+	def _grid(self, kind, a, b, c, d):
+		"""(shape, cell key) of every grid cell each shape's bounding box covers."""
+		circle = kind == CIRCLE
+		# bounding boxes in cells
+		left = np.where(circle, a - c, a)
+		top = np.where(circle, b - c, b)
+		right = np.where(circle, a + c, c)
+		bottom = np.where(circle, b + c, d)
+		cs = self.cell_size
+		gx0, gy0 = np.floor_divide(left, cs).astype(np.int64), np.floor_divide(top, cs).astype(np.int64)
+		gx1, gy1 = np.floor_divide(right, cs).astype(np.int64), np.floor_divide(bottom, cs).astype(np.int64)
+		# one grid entry per (shape, covered cell)
+		nx, ny = gx1 - gx0 + 1, gy1 - gy0 + 1
+		count = nx * ny
+		shape_of = np.repeat(np.arange(len(kind)), count)
+		k = np.arange(len(shape_of)) - np.repeat(np.cumsum(count) - count, count)
+		cx = gx0[shape_of] + k // ny[shape_of]
+		cy = gy0[shape_of] + k % ny[shape_of]
+		return shape_of, (cx << 32) + cy
+
+	def contacts(self, small_world=None):
+		"""Contacts of every interacting pair of shapes, see INTERACTIONS.
+
+		Worlds of at most `small_world` shapes (SMALL_WORLD by default) test
+		every pair; 0 always uses the grid.
+		"""
+		if small_world is None:
+			small_world = SMALL_WORLD
+		layer, kind, shape, index, owner = self._arrays()
+		if not len(layer):
+			return []
+		a, b, c, d = shape
+		n_shapes = len(layer)
+		if n_shapes > small_world:
+			shape_of, cell = self._grid(kind, a, b, c, d)
+			entry_layer = layer[shape_of]
+		contacts = []
+		for la, lb in INTERACTIONS:
+			if n_shapes <= small_world:
+				i, j = np.flatnonzero(layer == la), np.flatnonzero(layer == lb)
+				if not len(i) or not len(j):
+					continue
+				i, j = np.repeat(i, len(j)), np.tile(j, len(i))
+			else:
+				i, j = _grid_pairs(shape_of, cell, entry_layer == la, entry_layer == lb, n_shapes)
+				if not len(i):
+					continue
+			hit = _overlap(kind[i], a[i], b[i], c[i], d[i], kind[j], a[j], b[j], c[j], d[j])
+			for p, q in zip(i[hit].tolist(), j[hit].tolist()):
+				contacts.append(Contact(la, self._owner(owner[p]), int(index[p]),
+										lb, self._owner(owner[q]), int(index[q])))
+		return contacts
+
+
+def _circle_rect(x, y, r, left, top, right, bottom):
+	dx = x - np.clip(x, left, right)
+	dy = y - np.clip(y, top, bottom)
+	return dx * dx + dy * dy < r * r
+
+
+def _overlap(ka, a0, a1, a2, a3, kb, b0, b1, b2, b3):
+	"""Exact overlap test of shape pairs given as arrays (see CollisionWorld)."""
+	rects = (a0 < b2) & (b0 < a2) & (a1 < b3) & (b1 < a3)
+	circle_rect = _circle_rect(a0, a1, a2, b0, b1, b2, b3)
+	rect_circle = _circle_rect(b0, b1, b2, a0, a1, a2, a3)
+	dx, dy, rr = a0 - b0, a1 - b1, a2 + b2
+	circles = dx * dx + dy * dy < rr * rr
+	ca, cb = ka == CIRCLE, kb == CIRCLE
+	return np.where(ca, np.where(cb, circles, circle_rect), np.where(cb, rect_circle, rects))
+
+
+def _grid_pairs(shape_of, cell, in_a, in_b, n_shapes):
+	"""Shape pairs (i on side a, j on side b) sharing a grid cell, each pair once, sorted."""
+	count_a, count_b = np.count_nonzero(in_a), np.count_nonzero(in_b)
+	if not count_a or not count_b:
+		return (), ()
+	# sort the side with fewer entries and look the other side's cells up in it
+	small, large = (in_a, in_b) if count_a < count_b else (in_b, in_a)
+	order = np.argsort(cell[small], kind='stable')
+	small_cells = cell[small][order]
+	small_shapes = shape_of[small][order]
+	large_cells = cell[large]
+	lo = np.searchsorted(small_cells, large_cells, 'left')
+	hi = np.searchsorted(small_cells, large_cells, 'right')
+	# expand each large side entry into the small side entries of its cell
+	n = hi - lo
+	total = int(n.sum())
+	if not total:
+		return (), ()
+	i = np.repeat(shape_of[large], n)
+	j = small_shapes[np.repeat(lo, n) + np.arange(total) - np.repeat(np.cumsum(n) - n, n)]
+	if small is in_a:
+		i, j = j, i
+	# shapes sharing several cells were paired once per cell
+	pairs = np.unique(i * n_shapes + j)
+	return pairs // n_shapes, pairs % n_shapes
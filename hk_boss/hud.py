@@ -1,4 +1,5 @@
 import pygame
+from text import render_text
 
 
 class HUD:
@@ -13,8 +14,7 @@ class HUD:
 		for i in range(self.player.health):
 			pygame.draw.rect(surface, (200, 80, 80), (x + i * 14, y, 12, 12))
 		# boss name
-		font = pygame.font.SysFont('arial', 18)
-		text = font.render('DOUBLE HOLLOW-BUG', True, (230, 230, 230))
+		text = render_text('DOUBLE HOLLOW-BUG', 18, (230, 230, 230), 'arial')
 		surface.blit(text, (surface.get_width() - text.get_width() - 12, 12))
 
 		# draw boss health bars (left and right)
@@ -1,6 +1,7 @@
 
 
 import pygame
+from collision import PLAYER, PLAYER_ATTACK
 
 
 class Player:
@@ -199,6 +200,11 @@ class Player:
 	def get_hitbox(self):
 		return pygame.Rect(int(self.x + 6), int(self.y + 6), self.width - 12, self.height - 12)
 
+	def add_colliders(self, world):
+		world.add_rect(PLAYER, self, self.get_hitbox())
+		if self.attacking:
+			world.add_rect(PLAYER_ATTACK, self, self.get_attack_hitbox())
+
 	def get_attack_hitbox(self):
 		# short rectangle in front of player
 		# compute hitbox from original base sizes (original_w=40, original_h=22)
@@ -1,48 +1,113 @@
 import pygame
 import math
+from itertools import repeat
+import numpy as np
 
-class Projectile:
-	"""A small projectile spawned by bosses."""
-	def __init__(self, x, y, vx, vy, radius=6, color=(200,160,60), life=3.0, damage=1):
-		self.x = x
-		self.y = y
-		self.vx = vx
-		self.vy = vy
-		self.radius = radius
+class ProjectilePool:
+	"""Every live projectile of a fight, one NumPy array per field.
+
+	Live projectiles are the first `count` entries. Expired ones are
+	replaced by live ones from the end (swap-remove), so removing k of
+	them moves k entries instead of shifting the whole list, and update,
+	collision and drawing are a few array operations however many there are.
+	"""
+	def __init__(self, capacity=256, color=(200, 160, 60)):
+		self.count = 0
 		self.color = color
-		self.life = life
-		self.damage = damage
-		self.alive = True
+		self._allocate(capacity)
+		self._sprites = {}  # radius -> pre-drawn circle
+
+	def _allocate(self, capacity):
+		old = self.count
+		fields = {}
+		for name, dtype in (('x', np.float64), ('y', np.float64), ('vx', np.float64), ('vy', np.float64),
+				('radius', np.float64), ('life', np.float64), ('damage', np.int32)):
+			array = np.zeros(capacity, dtype=dtype)
+			if old:
+				array[:old] = getattr(self, name)[:old]
+			fields[name] = array
+		self.__dict__.update(fields)
+		self.capacity = capacity
+
+	def __len__(self):
+		return self.count
+
+	def spawn(self, x, y, vx, vy, radius=6, life=3.0, damage=1):
+		"""Add projectiles; every argument may be a number or an array."""
+		n = np.broadcast(x, y, vx, vy, radius, life, damage).size
+		if self.count + n > self.capacity:
+			self._allocate(max(2 * self.capacity, self.count + n))
+		s = slice(self.count, self.count + n)
+		self.x[s] = x
+		self.y[s] = y
+		self.vx[s] = vx
+		self.vy[s] = vy
+		self.radius[s] = radius
+		self.life[s] = life
+		self.damage[s] = damage
+		self.count += n
+		return n
 
 	def update(self, dt):
-		self.x += self.vx * dt
-		self.y += self.vy * dt
-		self.life -= dt
-		if self.life <= 0:
-			self.alive = False
+		n = self.count
+		self.x[:n] += self.vx[:n] * dt
+		self.y[:n] += self.vy[:n] * dt
+		self.life[:n] -= dt
+		self.remove(self.life[:n] <= 0)
 
-	def draw(self, surface):
-		r = int(self.radius)
-		pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), r)
+	def remove(self, dead):
+		"""Drop the projectiles where the bool array `dead` (length count) is set."""
+		n = self.count
+		alive = n - int(np.count_nonzero(dead))
+		if alive == n:
+			return
+		# holes left among the first `alive` entries are filled with the
+		# live entries past them
+		holes = np.flatnonzero(dead[:alive])
+		movers = alive + np.flatnonzero(~dead[alive:])
+		for array in (self.x, self.y, self.vx, self.vy, self.radius, self.life, self.damage):
+			array[holes] = array[movers]
+		self.count = alive
+
+	def _sprite(self, r):
+		sprite = self._sprites.get(r)
+		if sprite is None:
+			# colorkeyed rather than per-pixel alpha: blits are about twice as fast
+			sprite = pygame.Surface((2 * r + 1, 2 * r + 1))
+			sprite.fill((255, 0, 255))
+			pygame.draw.circle(sprite, self.color, (r, r), r)
+			sprite.set_colorkey((255, 0, 255), pygame.RLEACCEL)
+			self._sprites[r] = sprite
+		return sprite
 
-	def get_rect(self):
-		return pygame.Rect(int(self.x - self.radius), int(self.y - self.radius), int(self.radius*2), int(self.radius*2))
+	def draw(self, surface):
+		n = self.count
+		if not n:
+			return
+		w, h = surface.get_size()
+		r = self.radius[:n].astype(int)
+		left = self.x[:n].astype(int) - r
+		top = self.y[:n].astype(int) - r
+		# skip the ones entirely off screen, then blit the rest in one call
+		shown = (left < w) & (top < h) & (left + 2 * r >= 0) & (top + 2 * r >= 0)
+		r, left, top = r[shown], left[shown].tolist(), top[shown].tolist()
+		# blits takes the pairs straight from zip, which reuses its tuples; a
+		# list of 10,000 new tuples a frame sets off garbage collections
+		if len(r) and r.min() == r.max():
+			sprites = repeat(self._sprite(int(r[0])))
+		else:
+			sprites = map(self._sprite, r.tolist())
+		surface.blits(zip(sprites, zip(left, top)), doreturn=False)
 
 
-def spawn_volley(center_x, center_y, speed=220, count=6, spread=0.6):
-	"""Return a list of Projectile objects in a spread away from center.
+def spawn_volley(pool, center_x, center_y, speed=220, count=6, spread=0.6, radius=6, life=3.0, damage=1):
+	"""Add a spread of projectiles moving away from center to `pool`.
 
 	spread controls angle spread in radians; count is number of projectiles.
 	They are emitted outward in an arc centered horizontally away from the boss.
+	Returns the number added.
 	"""
-	projs = []
 	# emit in a semi-circle downward+outward pattern; we'll spread angles across [-spread, +spread]
-	for i in range(count):
-		t = -spread + (i / max(1, count - 1)) * (spread * 2)
-		angle = math.pi/2 + t  # pi/2 is downward; tweak to bias outward
-		vx = math.cos(angle) * speed
-		vy = math.sin(angle) * speed
-		p = Projectile(center_x, center_y, vx, vy, radius=6, color=(200,160,60), life=3.0, damage=1)
-		projs.append(p)
-	return projs
-
+	t = -spread + (np.arange(count) / max(1, count - 1)) * (spread * 2)
+	angle = math.pi/2 + t  # pi/2 is downward; tweak to bias outward
+	return pool.spawn(center_x, center_y, np.cos(angle) * speed, np.sin(angle) * speed, radius, life, damage)
@@ -0,0 +1,153 @@
+"""Fixed-timestep fight simulation
+
+A FightSim advances the player, the bosses and their projectiles in steps
+of exactly TICK seconds and counts them. Nothing in a step reads the wall
+clock or the global `random` module (every boss part has its own seeded
+stream, see boss.random_stream), so the same seed and the same keys on
+every tick give bit-identical state, with or without a display, at
+whatever speed the machine allows.
+
+Keys are given per tick as a bitmask over INPUT_KEYS, the keys
+Player.handle_input reads. The window turns pygame's key state into a mask
+with key_mask; KeyMask turns it back into something handle_input can index.
+
+The game loop runs as many ticks as real time has passed and draws with
+`alpha`, how far it is between the last two ticks, so motion stays smooth
+at any refresh rate.
+"""
+import copy
+import pygame
+from player import Player
+from collision import CollisionWorld, PLAYER, PROJECTILE
+
+TICK_RATE = 60
+TICK = 1.0 / TICK_RATE
+
+INPUT_KEYS = [pygame.K_a, pygame.K_LEFT, pygame.K_d, pygame.K_RIGHT, pygame.K_w, pygame.K_UP,
+			  pygame.K_s, pygame.K_DOWN, pygame.K_SPACE, pygame.K_LSHIFT, pygame.K_k, pygame.K_j]
+KEY_BITS = {key: 1 << i for i, key in enumerate(INPUT_KEYS)}
+
+
+def key_mask(pressed):
+	"""Bitmask of the INPUT_KEYS held in pygame.key.get_pressed() output."""
+	mask = 0
+	for key, bit in KEY_BITS.items():
+		if pressed[key]:
+			mask |= bit
+	return mask
+
+
+class KeyMask:
+	"""Key state of one tick, indexed by pygame key like get_pressed()."""
+	__slots__ = ('mask',)
+
+	def __init__(self, mask):
+		self.mask = mask
+
+	def __getitem__(self, key):
+		return bool(self.mask & KEY_BITS.get(key, 0))
+
+
+class FightSim:
+	def __init__(self, bosses, player=None):
+		self.bosses = bosses
+		self.player = player if player is not None else Player(200, 450)
+		self.collisions = CollisionWorld()
+		self.tick = 0
+		# positions before the last tick, for drawing in between
+		self._previous = self._positions()
+
+	@property
+	def time(self):
+		return self.tick * TICK
+
+	@property
+	def over(self):
+		return getattr(self.player, 'finished_death', False) or getattr(self.bosses, 'win', False)
+
+	def _bodies(self):
+		return (self.player, self.bosses.left, self.bosses.right)
+
+	def _positions(self):
+		return [(body.x, body.y) for body in self._bodies()]
+
+	def step(self, mask=0):
+		"""Advance one tick with the INPUT_KEYS in `mask` held."""
+		self._previous = self._positions()
+		player = self.player
+		bosses = self.bosses
+		# input only when player not in death animation
+		if not getattr(player, 'dead_anim', False) and not getattr(player, 'finished_death', False):
+			player.handle_input(KeyMask(mask), TICK)
+		player.update(TICK)
+
+		bosses.update(TICK, player)
+
+		collisions = self.collisions
+		collisions.clear()
+		player.add_colliders(collisions)
+		bosses.add_colliders(collisions)
+		for contact in collisions.contacts():
+			if contact.layer == PLAYER:
+				# boss attacks and projectiles hurt only while alive
+				if not getattr(player, 'dead_anim', False):
+					if contact.other_layer == PROJECTILE:
+						player.take_damage(int(contact.other_owner.damage[contact.other_index]))
+					else:
+						player.take_damage(1)
+			else:
+				# player's melee attack hitting a boss part
+				contact.other_owner.take_damage(player.attack_damage)
+		self.tick += 1
+
+	def run(self, ticks, mask=0):
+		for _ in range(ticks):
+			self.step(mask)
+
+	def state(self):
+		"""Everything that changes during a fight as a tuple, for comparing runs."""
+		values = [self.tick]
+		for body in self._bodies():
+			# plain numbers and flags; sprites and the like never change
+			values += [(name, value) for name, value in sorted(vars(body).items())
+					   if isinstance(value, (int, float, str))]
+		for part in (self.bosses.left, self.bosses.right):
+			values.append(part.rng.getstate())
+		pool = self.bosses.projectiles
+		n = pool.count
+		values += [pool.x[:n].tobytes(), pool.y[:n].tobytes(), pool.life[:n].tobytes(),
+				   self.bosses.win, self.bosses.win_t]
+		return tuple(values)
+
+	def snapshot(self):
+		"""An independent copy of the simulation as it is now, to go back to later.
+
+		Sprites are shared with the copy instead of copied, stepping never changes them.
+		"""
+		pool = self.bosses.projectiles
+		memo = {id(self.collisions): CollisionWorld(), id(pool._sprites): pool._sprites}
+		for body in self._bodies():
+			memo[id(body.sprite)] = body.sprite
+		return copy.deepcopy(self, memo)
+
+	def draw(self, surface, alpha=1.0):
+		"""Draw the bosses and the player `alpha` of the way from the previous tick."""
+		bodies = self._bodies()
+		current = self._positions()
+		for body, (x0, y0), (x1, y1) in zip(bodies, self._previous, current):
+			body.x = x0 + (x1 - x0) * alpha
+			body.y = y0 + (y1 - y0) * alpha
+		# projectiles move in straight lines, so step them back along their velocity
+		pool = self.bosses.projectiles
+		n = pool.count
+		xs, ys = pool.x[:n].copy(), pool.y[:n].copy()
+		pool.x[:n] -= pool.vx[:n] * ((1.0 - alpha) * TICK)
+		pool.y[:n] -= pool.vy[:n] * ((1.0 - alpha) * TICK)
+		try:
+			self.bosses.draw(surface)
+			self.player.draw(surface)
+		finally:
+			# the simulation state must come back exactly as it was
+			pool.x[:n], pool.y[:n] = xs, ys
+			for body, (x, y) in zip(bodies, current):
+				body.x, body.y = x, y
@@ -0,0 +1,63 @@
+"""Cached fonts and rendered text
+
+Creating a font (SysFont looks the font up and loads the file) and
+rendering a string are both slow enough to show up in the frame time when
+done every frame. Fonts are kept by (name, size) and rendered surfaces by
+(text, name, size, color); both caches drop the least recently used entry
+when they are full, so text that changes every frame (a timer, a score)
+can't grow them without bound.
+"""
+from collections import OrderedDict
+import pygame
+
+
+class TextCache:
+	def __init__(self, max_fonts=16, max_surfaces=256):
+		self.max_fonts = max_fonts
+		self.max_surfaces = max_surfaces
+		self.fonts = OrderedDict()
+		self.surfaces = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def font(self, name, size):
+		"""pygame font for a system font name (None = pygame's default font)."""
+		key = (name, size)
+		font = self.fonts.get(key)
+		if font is not None:
+			self.fonts.move_to_end(key)
+			return font
+		if not pygame.font.get_init():
+			pygame.font.init()
+		font = pygame.font.SysFont(name, size)
+		self.fonts[key] = font
+		if len(self.fonts) > self.max_fonts:
+			self.fonts.popitem(last=False)
+		return font
+
+	def render(self, text, size, color, name=None):
+		"""Antialiased surface of `text`; don't draw on it, it is shared."""
+		key = (text, name, size, color)
+		surface = self.surfaces.get(key)
+		if surface is not None:
+			self.surfaces.move_to_end(key)
+			self.hits += 1
+			return surface
+		self.misses += 1
+		surface = self.font(name, size).render(text, True, color)
+		self.surfaces[key] = surface
+		if len(self.surfaces) > self.max_surfaces:
+			self.surfaces.popitem(last=False)
+		return surface
+
+	def clear(self):
+		self.fonts.clear()
+		self.surfaces.clear()
+
+
+# shared by the HUD, menus and overlays
+cache = TextCache()
+
+
+def render_text(text, size, color, name=None):
+	return cache.render(text, size, color, name)